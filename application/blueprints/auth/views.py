@@ -1,3 +1,5 @@
+import threading
+import time
 from http import HTTPStatus
 
 import requests
@@ -5,9 +7,14 @@ from flask import Blueprint, current_app, flash, redirect, request, session, url
 from is_safe_url import is_safe_url
 
 from application.extensions import oauth
+from application.http_client import get_session
 
 auth = Blueprint("auth", __name__, url_prefix="/auth")
 
+# login -> (is member, monotonic expiry time)
+_membership_cache = {}
+_membership_lock = threading.Lock()
+
 
 @auth.get("/login")
 def login():
@@ -20,23 +27,26 @@ def login():
 def authorize():
     next_url = session.pop("next", None)
     token = oauth.github.authorize_access_token()
-    resp = oauth.github.get("user", token=token)
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {token['access_token']}",
+        "X-GitHub-Api-Version": "2022-11-28",
+    }
+    resp = get_session().get(
+        _github_api_url("user"),
+        headers=headers,
+        timeout=current_app.config["GITHUB_TIMEOUT"],
+    )
     resp.raise_for_status()
     user_profile = resp.json()
     if user_profile:
-        headers = {
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {token['access_token']}",
-            "X-GitHub-Api-Version": "2022-11-28",
-        }
-        # check if user is a member of digitial-land org - if they are the members endpoint
-        # will return status code 204
-        # https://docs.github.com/en/rest/orgs/members?apiVersion=2022-11-28#check-organization-membership-for-a-user
-        url = (
-            f"https://api.github.com/orgs/digital-land/members/{user_profile['login']}"
-        )
-        resp = requests.get(url, headers=headers)
-        if resp.status_code == HTTPStatus.NO_CONTENT:
+        try:
+            is_member = _is_member(user_profile["login"], headers)
+        except requests.RequestException:
+            current_app.logger.exception("GitHub membership check failed")
+            flash("We couldn't check your GitHub membership, please try again later")
+            return redirect(url_for("main.index"))
+        if is_member:
             session["user"] = user_profile
             next_url = _make_next_url_safe(next_url)
             return redirect(next_url)
@@ -45,11 +55,12 @@ def authorize():
             client_secret = current_app.config["GITHUB_CLIENT_SECRET"]
             params = {"access_token": token["access_token"]}
             headers = {"X-GitHub-Api-Version": "2022-11-28"}
-            resp = requests.delete(
-                f"https://api.github.com/applications/{client_id}/grant",
+            resp = get_session().delete(
+                _github_api_url(f"applications/{client_id}/grant"),
                 headers=headers,
                 params=params,
                 auth=(client_id, client_secret),
+                timeout=current_app.config["GITHUB_TIMEOUT"],
             )
             flash("You must be a member of the digital-land organisation to log in")
             return redirect(url_for("main.index"))
@@ -71,3 +82,40 @@ def _make_next_url_safe(next_url):
     if not is_safe_url(next_url, current_app.config.get("SAFE_URLS", {})):
         return url_for("main.index")
     return next_url
+
+
+def _github_api_url(path):
+    return f"{current_app.config['GITHUB_API_URL']}/{path}"
+
+
+def _is_member(login, headers):
+    """
+    Whether login is a member of the digital-land org. Decisions are cached
+    per login for GITHUB_MEMBERSHIP_TTL seconds. Raises requests.HTTPError
+    if GitHub gives no definite answer, e.g. when rate limited or down.
+    """
+    now = time.monotonic()
+    with _membership_lock:
+        cached = _membership_cache.get(login)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    # the members endpoint returns 204 for members of the org and 404 for
+    # anyone else
+    # https://docs.github.com/en/rest/orgs/members?apiVersion=2022-11-28#check-organization-membership-for-a-user
+    resp = get_session().get(
+        _github_api_url(f"orgs/digital-land/members/{login}"),
+        headers=headers,
+        timeout=current_app.config["GITHUB_TIMEOUT"],
+    )
+    if resp.status_code not in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_FOUND):
+        raise requests.HTTPError(
+            f"{resp.status_code} checking {login}'s membership", response=resp
+        )
+    is_member = resp.status_code == HTTPStatus.NO_CONTENT
+
+    ttl = current_app.config["GITHUB_MEMBERSHIP_TTL"]
+    if ttl > 0:
+        with _membership_lock:
+            _membership_cache[login] = (is_member, now + ttl)
+    return is_member
@@ -1,12 +1,11 @@
 import datetime
-import io
+import hashlib
 import uuid
 from collections import OrderedDict
-from csv import DictWriter
 
-import requests
 from flask import (
     Blueprint,
+    Response,
     abort,
     current_app,
     flash,
@@ -15,20 +14,145 @@ from flask import (
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
-from sqlalchemy import desc
-
+from sqlalchemy import desc, func, literal_column, tuple_
+from sqlalchemy.orm import selectinload
+
+from application.entities import (
+    claim_entity,
+    next_entity,
+    remaining_entities,
+    reserve_entities,
+    reserve_row_ids,
+)
 from application.extensions import db
+from application.finder import finder_index
 from application.forms import FormBuilder
 from application.models import ChangeLog, ChangeType, Dataset, Record, create_change_log
-from application.utils import collect_start_date, login_required
+from application.platform import platform_dataset_url, platform_status
+from application.registers import csv_chunks
+from application.search import search_records
+from application.utils import as_utc, collect_start_date, login_required
 
 main = Blueprint("main", __name__)
 
+CHANGE_LOG_MAX_ROWS = 1000
+CHANGE_LOG_PAGE_SIZE = 7
+CSV_CHUNK_SIZE = 500
+DEFAULT_PAGE_SIZE = 100
+FINDER_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
 def _github_login():
     return session.get("user", {}).get("login")
 
+
+def _page_size(default=DEFAULT_PAGE_SIZE):
+    page_size = request.args.get("page_size", default, type=int)
+    if page_size < 1:
+        return default
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def _record_page(dataset_id, *options):
+    """
+    Keyset page of a dataset's records ordered by row_id, loaded with any
+    loader options given.
+
+    The page starts after the row_id in the ``after`` query arg, or ends before
+    the one in ``before``. The returned ``next`` and ``prev`` cursors are None
+    when there are no more records in that direction.
+    """
+    page_size = _page_size()
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    dataset_records = Record.query.filter(Record.dataset_id == dataset_id)
+    query = dataset_records.options(*options)
+
+    if before is not None:
+        has_next = db.session.query(
+            dataset_records.filter(Record.row_id >= before).exists()
+        ).scalar()
+        records = (
+            query.filter(Record.row_id < before)
+            .order_by(Record.row_id.desc())
+            .limit(page_size + 1)
+            .all()
+        )
+        has_prev = len(records) > page_size
+        records = list(reversed(records[:page_size]))
+    else:
+        if after is not None:
+            query = query.filter(Record.row_id > after)
+        records = query.order_by(Record.row_id).limit(page_size + 1).all()
+        has_next = len(records) > page_size
+        records = records[:page_size]
+        has_prev = after is not None
+
+    return {
+        "records": records,
+        "page_size": page_size,
+        "next": records[-1].row_id if records and has_next else None,
+        "prev": records[0].row_id if records and has_prev else None,
+    }
+
+
+def _page_links(endpoint, record_page, **values):
+    links = {"next": None, "prev": None}
+    if record_page["next"] is not None:
+        links["next"] = url_for(
+            endpoint,
+            after=record_page["next"],
+            page_size=record_page["page_size"],
+            **values,
+        )
+    if record_page["prev"] is not None:
+        links["prev"] = url_for(
+            endpoint,
+            before=record_page["prev"],
+            page_size=record_page["page_size"],
+            **values,
+        )
+    return links
+
+
+def _pagination(links):
+    return {
+        key: {"href": href}
+        for key, href in [("previous", links["prev"]), ("next", links["next"])]
+        if href is not None
+    }
+
+
+def _not_modified_response(etag, last_modified):
+    """
+    A 304 response if the client's cached copy matches the ETag (or, when no
+    ETag is sent, is at least as new as last_modified), otherwise None.
+    """
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified is not None:
+        not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        not_modified = False
+    if not not_modified:
+        return None
+    return _with_cache_headers(Response(status=304), etag, last_modified)
+
+
+def _with_cache_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # let pipelines and proxies keep a copy but revalidate it on every request
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
 def get_tab_list(dataset):
     return [
         {"title": "Records", "url": url_for("main.dataset", id=dataset.dataset)},
@@ -42,24 +166,46 @@ def get_tab_list(dataset):
 @main.route("/")
 @main.route("/index")
 def index():
-    ds = (
-        db.session.query(Dataset)
+    return render_template(
+        "datasets.html", datasets=_active_datasets_with_counts(), isHomepage=True
+    )
+
+
+@main.route("/index.json")
+def index_json():
+    versions = (
+        db.session.query(Dataset.dataset, Dataset.version, Dataset.modified)
         .filter(Dataset.end_date.is_(None))
         .order_by(Dataset.dataset)
         .all()
     )
-    return render_template("datasets.html", datasets=ds, isHomepage=True)
+    etag = hashlib.sha256(
+        ",".join(f"{dataset}-{version}" for dataset, version, _ in versions).encode()
+    ).hexdigest()
+    modified = [as_utc(modified) for _, _, modified in versions if modified]
+    last_modified = max(modified) if modified else None
+    not_modified = _not_modified_response(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = {
+        "datasets": [
+            dataset.to_dict(total_records=total_records)
+            for dataset, total_records in _active_datasets_with_counts()
+        ]
+    }
+    return _with_cache_headers(make_response(data), etag, last_modified)
 
 
-@main.route("/index.json")
-def index_json():
-    ds = (
-        db.session.query(Dataset)
+def _active_datasets_with_counts():
+    return (
+        db.session.query(Dataset, db.func.count(Record.id))
+        .outerjoin(Record, Record.dataset_id == Dataset.dataset)
         .filter(Dataset.end_date.is_(None))
+        .group_by(Dataset.dataset)
         .order_by(Dataset.dataset)
         .all()
     )
-    return {"datasets": [d.to_dict() for d in ds]}
 
 
 @main.route("/support")
@@ -100,26 +246,53 @@ def dataset(id):
         "itemsList": get_tab_list(dataset),
     }
     page = {"title": dataset.name, "caption": "Dataset"}
-    records = [record for record in dataset.records]
+    record_page = _record_page(dataset.dataset)
+    total_records = dataset.record_count()
+    links = _page_links("main.dataset", record_page, id=dataset.dataset)
     return render_template(
         "records.html",
         dataset=dataset,
         breadcrumbs=breadcrumbs,
         sub_navigation=sub_navigation,
         page=page,
-        records=records,
+        records=record_page["records"],
+        total_records=total_records,
+        pagination=_pagination(links),
     )
 
 
 @main.route("/dataset/<string:id>.json")
 def dataset_json(id):
     dataset = Dataset.query.get_or_404(id)
-    return {
+    not_modified = _not_modified_response(dataset.etag, dataset.last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = {
         "dataset": dataset.dataset,
         "name": dataset.name,
         "fields": [field.field for field in dataset.fields],
-        "records": [r.to_dict() for r in dataset.records],
     }
+    if request.args.get("all", "").lower() == "true":
+        records = (
+            Record.query.filter(Record.dataset_id == dataset.dataset)
+            .order_by(Record.row_id)
+            .yield_per(CSV_CHUNK_SIZE)
+        )
+        data["records"] = [record.to_dict() for record in records]
+        return _with_cache_headers(
+            make_response(data), dataset.etag, dataset.last_modified
+        )
+
+    record_page = _record_page(dataset.dataset)
+    data["records"] = [record.to_dict() for record in record_page["records"]]
+    data["page_size"] = record_page["page_size"]
+    data["next"] = record_page["next"]
+    data["prev"] = record_page["prev"]
+    data["links"] = _page_links(
+        "main.dataset_json", record_page, id=dataset.dataset, _external=True
+    )
+    return _with_cache_headers(make_response(data), dataset.etag, dataset.last_modified)
 
 
 @main.route("/dataset/<string:id>/change-log")
@@ -140,52 +313,359 @@ def change_log(id):
         "itemsList": get_tab_list(dataset),
     }
     page = {"title": dataset.name, "caption": "Dataset"}
-
-    changes_by_date = OrderedDict()
-
-    changes = (
-        ChangeLog.query.filter(ChangeLog.dataset_id == dataset.dataset)
-        .order_by(desc(ChangeLog.created_date), ChangeLog.change_type)
-        .all()
-    )
-
-    for change in changes:
-        if change.created_date not in changes_by_date.keys():
-            changes_by_date[change.created_date] = []
-        changes_by_date[change.created_date].append(change)
+    change_page = _change_log_page(dataset.dataset)
+    links = _page_links("main.change_log", change_page, id=dataset.dataset)
 
     return render_template(
         "change-log.html",
         dataset=dataset,
-        changes_by_date=changes_by_date,
+        changes_by_date=change_page["changes_by_date"],
         breadcrumbs=breadcrumbs,
         sub_navigation=sub_navigation,
         page=page,
+        pagination=_pagination(links),
+    )
+
+
+@main.route("/dataset/<string:id>/change-log.json")
+def change_log_json(id):
+    dataset = Dataset.query.get_or_404(id)
+    not_modified = _not_modified_response(dataset.etag, dataset.last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    change_page = _change_log_page(dataset.dataset)
+    data = {
+        "dataset": dataset.dataset,
+        "days": [
+            {
+                "date": change_date.isoformat(),
+                "changes": [
+                    {
+                        "id": str(change.id),
+                        "change_type": change.change_type.value,
+                        "notes": change.notes,
+                        "github_login": change.github_login,
+                        "record_id": (
+                            str(change.record_id) if change.record_id else None
+                        ),
+                        "data": change.data,
+                    }
+                    for change in changes
+                ],
+            }
+            for change_date, changes in change_page["changes_by_date"].items()
+        ],
+        "page_size": change_page["page_size"],
+        "next": change_page["next"],
+        "prev": change_page["prev"],
+        "links": _page_links(
+            "main.change_log_json", change_page, id=dataset.dataset, _external=True
+        ),
+    }
+    return _with_cache_headers(make_response(data), dataset.etag, dataset.last_modified)
+
+
+def _change_log_page(dataset_id):
+    """
+    Keyset page of a dataset's changes grouped by day, newest first, and by
+    change type then id within a day. A page holds up to page_size days, and
+    stops before a day that would take it over CHANGE_LOG_MAX_ROWS changes.
+    A day with more changes than that is split across pages.
+
+    The ``before`` and ``after`` query args are cursors (see
+    _change_log_cursor). One query finds the page's days and their number of
+    changes, a second loads the changes.
+    """
+    page_size = _page_size(CHANGE_LOG_PAGE_SIZE)
+    after = request.args.get("after", type=_change_log_cursor)
+    before = request.args.get("before", type=_change_log_cursor)
+    changes = ChangeLog.query.filter(ChangeLog.dataset_id == dataset_id)
+
+    # newer days come first, so "after" pages back in time
+    if before is not None:
+        newer = _newer_changes(*before)
+        found = (
+            _change_days(changes.filter(newer))
+            .order_by(ChangeLog.created_date)
+            .limit(page_size + 1)
+            .all()
+        )
+        days = _days_within_row_limit(found[:page_size])
+        loaded = _load_changes(
+            changes.filter(newer),
+            days,
+            ChangeLog.created_date,
+            desc(ChangeLog.change_type),
+            desc(ChangeLog.id),
+        )
+        split = len(loaded) > CHANGE_LOG_MAX_ROWS
+        loaded = list(reversed(loaded[:CHANGE_LOG_MAX_ROWS]))
+        has_prev = len(found) > len(days) or split
+        has_next = _exists(changes.filter(~newer))
+        start_in_day, end_in_day = split, before[1] is not None
+    else:
+        page = changes
+        has_prev = False
+        if after is not None:
+            seen = _newer_changes(*after, inclusive=True)
+            page = changes.filter(~seen)
+            has_prev = _exists(changes.filter(seen))
+        found = (
+            _change_days(page)
+            .order_by(desc(ChangeLog.created_date))
+            .limit(page_size + 1)
+            .all()
+        )
+        days = _days_within_row_limit(found[:page_size])
+        loaded = _load_changes(
+            page,
+            days,
+            desc(ChangeLog.created_date),
+            ChangeLog.change_type,
+            ChangeLog.id,
+        )
+        split = len(loaded) > CHANGE_LOG_MAX_ROWS
+        loaded = loaded[:CHANGE_LOG_MAX_ROWS]
+        has_next = len(found) > len(days) or split
+        start_in_day, end_in_day = after is not None and after[1] is not None, split
+
+    changes_by_date = OrderedDict()
+    for change in loaded:
+        changes_by_date.setdefault(change.created_date, []).append(change)
+
+    return {
+        "changes_by_date": changes_by_date,
+        "page_size": page_size,
+        "next": (
+            _change_log_position(loaded[-1], end_in_day)
+            if loaded and has_next
+            else None
+        ),
+        "prev": (
+            _change_log_position(loaded[0], start_in_day)
+            if loaded and has_prev
+            else None
+        ),
+    }
+
+
+def _change_log_cursor(value):
+    """
+    A change log cursor as (day, (change_type, id)), where the second item is
+    None for a cursor at the end of the day. Cursors are the ISO date of a day
+    when a page ends with the whole day, or "<date>.<change type>.<id hex>" of
+    its last change when the page ends part way through the day.
+    """
+    day, _, change = value.partition(".")
+    day = datetime.date.fromisoformat(day)
+    if not change:
+        return day, None
+    change_type, _, change_id = change.partition(".")
+    return day, (ChangeType(change_type), uuid.UUID(hex=change_id))
+
+
+def _change_log_position(change, in_day):
+    if in_day:
+        return ".".join(
+            [
+                change.created_date.isoformat(),
+                change.change_type.value,
+                change.id.hex,
+            ]
+        )
+    return change.created_date.isoformat()
+
+
+def _newer_changes(day, change=None, inclusive=False):
+    """
+    Changes that come before the cursor in the change log's order, and with
+    inclusive, the change at the cursor too.
+    """
+    if change is None:
+        if inclusive:
+            return ChangeLog.created_date >= day
+        return ChangeLog.created_date > day
+    key = tuple_(ChangeLog.change_type, ChangeLog.id)
+    cursor = tuple_(*change, types=[ChangeLog.change_type.type, ChangeLog.id.type])
+    return (ChangeLog.created_date > day) | (
+        (ChangeLog.created_date == day) & (key <= cursor if inclusive else key < cursor)
     )
 
 
+def _change_days(changes):
+    return changes.with_entities(
+        ChangeLog.created_date, func.count(ChangeLog.id)
+    ).group_by(ChangeLog.created_date)
+
+
+def _load_changes(changes, days, *order_by):
+    """
+    Up to one more than CHANGE_LOG_MAX_ROWS of the changes on days, so the
+    caller can tell when a day has been split.
+    """
+    if not days:
+        return []
+    return (
+        changes.filter(
+            ChangeLog.created_date >= min(days), ChangeLog.created_date <= max(days)
+        )
+        .order_by(*order_by)
+        .limit(CHANGE_LOG_MAX_ROWS + 1)
+        .all()
+    )
+
+
+def _exists(query):
+    return db.session.query(query.exists()).scalar()
+
+
+def _days_within_row_limit(day_counts):
+    days = []
+    total = 0
+    for day, count in day_counts:
+        total += count
+        if days and total > CHANGE_LOG_MAX_ROWS:
+            break
+        days.append(day)
+    return days
+
+
+@main.route("/dataset/<string:id>/changes.json")
+def changes_json(id):
+    dataset = Dataset.query.get_or_404(id)
+    return _change_feed("main.changes_json", dataset.dataset, id=dataset.dataset)
+
+
+@main.route("/changes.json")
+def all_changes_json():
+    return _change_feed("main.all_changes_json")
+
+
+def _change_feed(endpoint, dataset_id=None, **values):
+    """
+    Records added or edited since the ``since`` cursor, in the order of their
+    latest change, with each record's current values.
+
+    The feed reads change_log in (txid, id) order, where txid is the id of
+    the transaction that inserted the change. On Postgres only changes from
+    transactions older than every transaction still in progress are served,
+    so a change that commits late, such as one from a long upload job, can't
+    appear behind a cursor a consumer has already moved past. While such a
+    transaction is open, later changes are held back until it ends.
+
+    ``next`` is the cursor to pass as ``since`` for the following page, and is
+    returned even when there are no changes so consumers can poll with it.
+    """
+    page_size = _page_size()
+    since = request.args.get("since")
+    query = ChangeLog.query.filter(ChangeLog.record_id.is_not(None))
+    if dataset_id is not None:
+        query = query.filter(ChangeLog.dataset_id == dataset_id)
+    if db.session.get_bind().dialect.name == "postgresql":
+        query = query.filter(
+            ChangeLog.txid
+            < literal_column("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        )
+    if since:
+        try:
+            txid, change_id = _parse_feed_cursor(since)
+        except ValueError:
+            abort(400, "Invalid since cursor")
+        query = query.filter(
+            tuple_(ChangeLog.txid, ChangeLog.id) > tuple_(txid, change_id)
+        )
+    changes = query.order_by(ChangeLog.txid, ChangeLog.id).limit(page_size + 1).all()
+    more = len(changes) > page_size
+    changes = changes[:page_size]
+
+    # the latest change to each record on the page
+    latest = OrderedDict()
+    for change in changes:
+        latest.pop(change.record_id, None)
+        latest[change.record_id] = change
+    records = {
+        record.id: record
+        for record in Record.query.filter(Record.id.in_(list(latest.keys())))
+    }
+
+    next_cursor = _feed_cursor(changes[-1]) if changes else since
+    data = {
+        "since": since,
+        "records": [
+            {
+                "dataset": change.dataset_id,
+                "id": str(record_id),
+                "change_type": change.change_type.value,
+                "cursor": _feed_cursor(change),
+                "record": (
+                    records[record_id].to_dict() if record_id in records else None
+                ),
+            }
+            for record_id, change in latest.items()
+        ],
+        "next": next_cursor,
+        "more": more,
+        "links": {
+            "next": (
+                url_for(
+                    endpoint,
+                    since=next_cursor,
+                    page_size=page_size,
+                    _external=True,
+                    **values,
+                )
+                if next_cursor
+                else None
+            )
+        },
+    }
+    if dataset_id is not None:
+        data["dataset"] = dataset_id
+    return data
+
+
+def _feed_cursor(change):
+    # the change's txid and id, e.g. 1234567.<hex>
+    return f"{change.txid}.{change.id.hex}"
+
+
+def _parse_feed_cursor(cursor):
+    txid, _, change_id = cursor.partition(".")
+    return int(txid), uuid.UUID(change_id)
+
+
 @main.route("/dataset/<string:id>/add", methods=["GET", "POST"])
 @login_required
 def add_record(id):
     dataset = Dataset.query.get_or_404(id)
     if dataset.end_date is not None:
         abort(404)
-    builder = FormBuilder(dataset.fields)
+    builder = FormBuilder(dataset.fields, dataset=dataset.dataset)
     form = builder.build()
     form_fields = builder.form_fields()
 
-    if hasattr(form, "entity"):
-        max_entity = (
-            db.session.query(db.func.max(Record.entity))
-            .filter(Record.dataset_id == dataset.dataset)
-            .scalar()
-        )
-        next_entity = (
-            max_entity + 1 if max_entity is not None else dataset.entity_minimum
-        )
-        form.entity.data = next_entity
+    if hasattr(form, "entity") and not form.is_submitted():
+        form.entity.data = next_entity(dataset)
 
     if form.validate_on_submit():
+        entity = form.entity.data if hasattr(form, "entity") else None
+        if entity is not None and not _entity_in_range(dataset, entity):
+            flash(
+                f"entity id {entity} is outside of range {dataset.entity_minimum} to {dataset.entity_maximum}"
+            )
+            return redirect(url_for("main.dataset", id=dataset.dataset))
+        try:
+            if entity is None:
+                entity = reserve_entities(dataset)[0]
+            else:
+                claim_entity(dataset, entity)
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for("main.dataset", id=dataset.dataset))
+        if hasattr(form, "entity"):
+            form.entity.data = entity
+
         data = form.data
 
         start_date, _ = collect_start_date(request.form)
@@ -200,20 +680,7 @@ def add_record(id):
         )
         data["entry-date"] = datetime.datetime.today().strftime("%Y-%m-%d")
 
-        last_record = (
-            db.session.query(Record)
-            .filter_by(dataset_id=dataset.dataset)
-            .order_by(Record.row_id.desc())
-            .first()
-        )
-        next_id = last_record.row_id + 1 if last_record else 0
-        entity = int(form.entity.data) if hasattr(form, "entity") else next_entity
-
-        if not (dataset.entity_minimum <= entity <= dataset.entity_maximum):
-            flash(
-                f"entity id {entity} is outside of range {dataset.entity_minimum} to {dataset.entity_maximum}"
-            )
-            return redirect(url_for("main.dataset", id=dataset.dataset))
+        next_id = reserve_row_ids(dataset)[0]
 
         if "csrf_token" in data:
             del data["csrf_token"]
@@ -283,6 +750,14 @@ def add_record(id):
     )
 
 
+def _entity_in_range(dataset, entity):
+    if dataset.entity_minimum is not None and entity < dataset.entity_minimum:
+        return False
+    if dataset.entity_maximum is not None and entity > dataset.entity_maximum:
+        return False
+    return True
+
+
 @main.route("/dataset/<string:id>/record/<string:record_id>", methods=["GET"])
 @login_required
 def get_record(id, record_id):
@@ -304,7 +779,10 @@ def edit_record(id, record_id):
         Record.dataset_id == dataset.dataset, Record.id == record_uuid
     ).one()
     builder = FormBuilder(
-        record.dataset.fields, include_edit_notes=True, require_reference=False
+        record.dataset.fields,
+        include_edit_notes=True,
+        require_reference=False,
+        dataset=dataset.dataset,
     )
     form = builder.build()
     form_fields = builder.form_fields()
@@ -428,14 +906,10 @@ def links(id):
         else None
     )
 
-    platform_url = f"{current_app.config['PLATFORM_URL']}/dataset/{dataset.dataset}"
-    try:
-        resp = requests.get(platform_url)
-        resp.raise_for_status()
-    except requests.exceptions.HTTPError:
-        platform_url = None
-    except Exception:
-        platform_url = None
+    status = platform_status(dataset.dataset)
+    platform_url = (
+        platform_dataset_url(dataset.dataset) if status and status.available else None
+    )
 
     return render_template(
         "links.html",
@@ -452,10 +926,27 @@ def links(id):
 @main.route("/dataset/<string:id>/schema.json")
 def schema_json(id):
     dataset = Dataset.query.get_or_404(id)
-    return {
+    not_modified = _not_modified_response(dataset.etag, dataset.last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = {
         "dataset": dataset.dataset,
         "fields": [field.to_dict() for field in dataset.fields],
     }
+    return _with_cache_headers(make_response(data), dataset.etag, dataset.last_modified)
+
+
+@main.route("/dataset/<string:id>/entities.json")
+def entities_json(id):
+    dataset = Dataset.query.get_or_404(id)
+    return {
+        "dataset": dataset.dataset,
+        "entity_minimum": dataset.entity_minimum,
+        "entity_maximum": dataset.entity_maximum,
+        "next_entity": next_entity(dataset),
+        "remaining": remaining_entities(dataset),
+    }
 
 
 @main.route("/dataset/<string:id>.csv")
@@ -463,24 +954,29 @@ def csv(id):
     dataset = Dataset.query.get_or_404(id)
     if dataset.end_date is not None:
         abort(404)
-    if dataset.records:
-        output = io.StringIO()
-        fieldnames = [field.field for field in dataset.sorted_fields()]
-        writer = DictWriter(output, fieldnames)
-        writer.writeheader()
-        for record in dataset.records:
-            writer.writerow(record.to_dict())
-            csv_output = output.getvalue().encode("utf-8")
-
-        response = make_response(csv_output)
-        response.headers[
-            "Content-Disposition"
-        ] = f"attachment; filename={dataset.dataset}.csv"
-        response.headers["Content-Type"] = "text/csv; charset=utf-8"
-        return response
-    else:
+    # any change to the records bumps the dataset version, so a matching ETag
+    # means the client's copy is current without touching the record table
+    not_modified = _not_modified_response(dataset.etag, dataset.last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    has_records = db.session.query(
+        Record.query.filter(Record.dataset_id == dataset.dataset).exists()
+    ).scalar()
+    if not has_records:
         abort(404)
 
+    fieldnames = [field.field for field in dataset.sorted_fields()]
+    response = Response(
+        stream_with_context(csv_chunks(dataset.dataset, fieldnames, CSV_CHUNK_SIZE)),
+        mimetype="text/csv",
+    )
+    response.headers[
+        "Content-Disposition"
+    ] = f"attachment; filename={dataset.dataset}.csv"
+    response.headers["Content-Type"] = "text/csv; charset=utf-8"
+    return _with_cache_headers(response, dataset.etag, dataset.last_modified)
+
 
 @main.route("/dataset/<string:id>/history")
 def history(id):
@@ -502,12 +998,14 @@ def history(id):
         "itemsList": get_tab_list(dataset),
     }
     page = {"title": dataset.name, "caption": "Dataset"}
+    record_page = _record_page(dataset.dataset, selectinload(Record.change_log))
     records = []
-    for record in dataset.records:
+    for record in record_page["records"]:
         for change in record.change_log:
             if change.data.get("from") is not None:
                 records.append(change.data["from"])
         records.append(record)
+    links = _page_links("main.history", record_page, id=dataset.dataset)
 
     return render_template(
         "records.html",
@@ -516,10 +1014,105 @@ def history(id):
         sub_navigation=sub_navigation,
         page=page,
         records=records,
+        total_records=dataset.record_count(),
+        pagination=_pagination(links),
         history=True,
     )
 
 
+@main.route("/dataset/<string:id>/history.json")
+def history_json(id):
+    dataset = Dataset.query.get_or_404(id)
+    if dataset.end_date is not None:
+        abort(404)
+    not_modified = _not_modified_response(dataset.etag, dataset.last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    record_page = _record_page(dataset.dataset, selectinload(Record.change_log))
+    data = {
+        "dataset": dataset.dataset,
+        "records": [
+            {
+                "id": str(record.id),
+                "current": record.to_dict(),
+                "history": [
+                    {
+                        "change_type": change.change_type.value,
+                        "date": change.created_date.isoformat(),
+                        "data": change.data["from"],
+                    }
+                    for change in record.change_log
+                    if change.data.get("from") is not None
+                ],
+            }
+            for record in record_page["records"]
+        ],
+        "page_size": record_page["page_size"],
+        "next": record_page["next"],
+        "prev": record_page["prev"],
+        "links": _page_links(
+            "main.history_json", record_page, id=dataset.dataset, _external=True
+        ),
+    }
+    return _with_cache_headers(make_response(data), dataset.etag, dataset.last_modified)
+
+
+@main.route("/dataset/<string:id>/search.json")
+def search_json(id):
+    dataset = Dataset.query.get_or_404(id)
+    if dataset.end_date is not None:
+        abort(404)
+    return _search("main.search_json", dataset.dataset, id=dataset.dataset)
+
+
+@main.route("/search.json")
+def all_search_json():
+    return _search("main.all_search_json")
+
+
+def _search(endpoint, dataset_id=None, **values):
+    """
+    A page of records matching the ``q`` query arg, best match first. Pages
+    are numbered from 1 by the ``page`` query arg.
+    """
+    q = request.args.get("q", "").strip()
+    page_size = _page_size()
+    page = max(request.args.get("page", 1, type=int), 1)
+    hits = search_records(
+        q, dataset_id, limit=page_size + 1, offset=(page - 1) * page_size
+    )
+    more = len(hits) > page_size
+    hits = hits[:page_size]
+
+    def page_link(number):
+        return url_for(
+            endpoint, q=q, page=number, page_size=page_size, _external=True, **values
+        )
+
+    data = {
+        "q": q,
+        "results": [
+            {
+                "dataset": record.dataset_id,
+                "id": str(record.id),
+                "rank": rank,
+                "record": record.to_dict(),
+            }
+            for record, rank in hits
+        ],
+        "page": page,
+        "page_size": page_size,
+        "links": {
+            "next": page_link(page + 1) if more else None,
+            "prev": page_link(page - 1) if page > 1 else None,
+        },
+    }
+    if dataset_id is not None:
+        data["dataset"] = dataset_id
+    return data
+
+
 @main.route("/dataset/<string:id>/finder")
 def finder(id):
     dataset = Dataset.query.get_or_404(id)
@@ -533,13 +1126,46 @@ def finder(id):
             {"text": "Category Finder"},
         ]
     }
-    active_records = sorted(
-        [record for record in dataset.records if record.end_date is None],
-        key=lambda record: record.data["name"],
-    )
+    entries, total = finder_index(dataset).search("", limit=FINDER_PAGE_SIZE)
     return render_template(
         "finder.html",
         dataset=dataset,
         breadcrumbs=breadcrumbs,
-        active_records=active_records,
+        entries=entries,
+        total=total,
+        page_size=FINDER_PAGE_SIZE,
     )
+
+
+@main.route("/dataset/<string:id>/finder.json")
+def finder_json(id):
+    dataset = Dataset.query.get_or_404(id)
+    q = request.args.get("q", "").strip()
+    page_size = _page_size(FINDER_PAGE_SIZE)
+    page = max(request.args.get("page", 1, type=int), 1)
+    entries, total = finder_index(dataset).search(
+        q, limit=page_size, offset=(page - 1) * page_size
+    )
+
+    def page_link(number):
+        return url_for(
+            "main.finder_json",
+            id=dataset.dataset,
+            q=q,
+            page=number,
+            page_size=page_size,
+            _external=True,
+        )
+
+    return {
+        "dataset": dataset.dataset,
+        "q": q,
+        "results": entries,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "links": {
+            "next": page_link(page + 1) if page * page_size < total else None,
+            "prev": page_link(page - 1) if page > 1 else None,
+        },
+    }
@@ -1,48 +1,29 @@
-import datetime
 import os
 import tempfile
-from collections import OrderedDict
+import uuid
 from csv import DictReader
 
 from flask import (
     Blueprint,
     abort,
-    current_app,
     flash,
     redirect,
     render_template,
     request,
+    session,
     url_for,
 )
 from werkzeug.utils import secure_filename
 
 from application.extensions import db
 from application.forms import CsvUploadForm
-from application.models import (
-    ChangeType,
-    Dataset,
-    Record,
-    Update,
-    UpdateRecord,
-    UpdateStatus,
-    create_change_log,
-)
-from application.utils import parse_date
+from application.ingest import check_update
+from application.jobs import enqueue
+from application.models import Dataset, Job, JobStatus, JobType, Update, UpdateStatus
 
 upload = Blueprint("upload", __name__)
 
 
-def _order_records(records):
-    def sort_key(item):
-        if item.get("end-date") is None or item.get("end-date") == "":
-            return datetime.date.max
-        else:
-            return item.get("end-date")
-
-    ordered = sorted(records, key=sort_key)
-    return ordered
-
-
 @upload.route("/dataset/<string:dataset>/upload", methods=["GET", "POST"])
 def upload_csv(dataset):
     form = CsvUploadForm()
@@ -56,7 +37,6 @@ def upload_csv(dataset):
             file_path = os.path.join(temp_dir, filename)
             try:
                 f.save(file_path)
-                starting_entity = ds.entity_minimum
                 with open(file_path, "r") as csv_file:
                     reader = DictReader(csv_file)
                     addtional_fields = set(reader.fieldnames) - set(fieldnames)
@@ -67,64 +47,18 @@ def upload_csv(dataset):
                         return redirect(
                             url_for("upload.upload_csv", dataset=ds.dataset)
                         )
-
-                    records = OrderedDict()
-
-                    for data in reader:
-                        entity = data.get("entity")
-                        if entity and int(entity) >= starting_entity:
-                            starting_entity = int(entity) + 1
-
-                        reference = data.get("reference")
-                        if reference not in records.keys():
-                            records[reference] = [data]
-                        else:
-                            records[reference].append(data)
-
-                for reference, data in records.items():
-                    for record in data:
-                        for key, value in record.items():
-                            if "-date" in key:
-                                if not value:
-                                    record[key] = None
-                                else:
-                                    record[key] = parse_date(value)
-
-                for row_id, reference in enumerate(records):
-                    data = records[reference]
-                    ordered = _order_records(data)
-                    original_record = ordered.pop(0)
-
-                    if original_record is not None:
-                        if not original_record.get("entity"):
-                            original_record["entity"] = starting_entity
-                            starting_entity += 1
-                        else:
-                            original_record["entity"] = int(original_record["entity"])
-                        try:
-                            record = Record.factory(
-                                row_id,
-                                original_record.get("entity"),
-                                ds.dataset,
-                                original_record,
-                                current_app.config,
-                            )
-                            ds.records.append(record)
-                            db.session.add(ds)
-                            db.session.commit()
-                        except Exception as e:
-                            print(f"Error: {e}")
-
-                        for rest in ordered:
-                            change_log = create_change_log(
-                                record, rest, ChangeType.EDIT
-                            )
-                            ds.change_log.append(change_log)
-                            db.session.add(record)
-                            db.session.add(ds)
-                            db.session.commit()
-
-                return redirect(url_for("main.dataset", id=ds.dataset))
+                    rows = list(reader)
+
+                job = enqueue(
+                    JobType.UPLOAD,
+                    ds,
+                    {"rows": rows},
+                    total=len(rows),
+                    github_login=_github_login(),
+                )
+                return redirect(
+                    url_for("upload.job_status", dataset=ds.dataset, job=job.id)
+                )
             except Exception as e:
                 flash(f"Error: {e}")
             finally:
@@ -157,20 +91,17 @@ def update_csv(dataset):
                         return redirect(
                             url_for("upload.update_csv", dataset=ds.dataset)
                         )
-                    records = []
-                    for row in reader:
-                        records.append(row)
-
-                update = Update(dataset_id=ds.dataset)
-                for record in records:
-                    update.records.append(UpdateRecord(data=record))
-
-                db.session.add(update)
-                db.session.commit()
+                    rows = list(reader)
+
+                job = enqueue(
+                    JobType.UPDATE,
+                    ds,
+                    {"rows": rows},
+                    total=len(rows),
+                    github_login=_github_login(),
+                )
                 return redirect(
-                    url_for(
-                        "upload.process_updates", dataset=ds.dataset, update=update.id
-                    )
+                    url_for("upload.job_status", dataset=ds.dataset, job=job.id)
                 )
             except Exception as e:
                 flash(f"Error: {e}")
@@ -186,42 +117,16 @@ def update_csv(dataset):
     "/dataset/<string:dataset>/process-updates/<string:update>", methods=["GET"]
 )
 def process_updates(dataset, update):
-    update = Update.query.filter(
-        Update.id == update,
-        Update.dataset_id == dataset,
-        Update.status == UpdateStatus.PENDING,
-    ).one_or_none()
-    if update is None:
-        return abort(404, f"No update found for this {dataset}")
+    update = _get_pending_update(dataset, update)
 
-    if update is None:
-        return abort(404, f"No update found for this {dataset}")
-
-    for record in update.records:
-        entity = record.data.get("entity")
-        if entity is None or entity.strip() == "":
-            flash("Missing entity in record")
-            abort(404)
-        entity = int(entity)
-        current_record = Record.query.filter(
-            Record.dataset_id == dataset,
-            Record.entity == entity,
-            Record.end_date.is_(None),
-        ).one_or_none()
-        if current_record is not None:
-            expected_fields = [field.field for field in current_record.dataset.fields]
-            record.changes = _check_update(
-                record.data,
-                current_record.to_dict(),
-                expected_fields,
-                current_record.change_log,
-            )
-        else:
-            record.new_record = True
-
-        if db.session.dirty:
-            db.session.add(record)
-            db.session.commit()
+    # updates staged before background jobs were added still need checking
+    try:
+        check_update(update)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e))
+        abort(404)
 
     updates = any([_any_updates(record) for record in update.records])
 
@@ -238,67 +143,38 @@ def process_updates(dataset, update):
     "/dataset/<string:dataset>/process-updates/<string:update>", methods=["POST"]
 )
 def apply_updates(dataset, update):
-    update = Update.query.filter(
-        Update.id == update,
-        Update.dataset_id == dataset,
-        Update.status == UpdateStatus.PENDING,
-    ).one_or_none()
-    if update is None:
-        return abort(404, f"No update found for this {dataset}")
-
-    dataset = update.dataset
-    update_record_ids = set(request.form.getlist("record_id"))
-    for update_record in update.records:
-        if str(update_record.id) in update_record_ids:
-            record = Record.query.filter(
-                Record.dataset_id == dataset.dataset,
-                Record.entity == update_record.data["entity"],
-            ).one_or_none()
-            if record is not None:
-                change_log = create_change_log(
-                    record, update_record.data, ChangeType.EDIT
-                )
-                dataset.change_log.append(change_log)
-                update_record.processed = True
-                db.session.add(record)
-                db.session.add(update_record)
-                db.session.add(dataset)
-            else:
-                row_id = (
-                    Record.query.filter(Record.dataset_id == dataset.dataset).count()
-                    + 1
-                )
-                record = Record.factory(
-                    row_id,
-                    update_record.data["entity"],
-                    dataset.dataset,
-                    update_record.data,
-                    current_app.config,
-                )
-                update_record.processed = True
-                dataset.records.append(record)
-                db.session.add(dataset)
-                db.session.add(record)
-                db.session.add(update_record)
+    update = _get_pending_update(dataset, update)
+
+    record_ids = request.form.getlist("record_id")
+    job = enqueue(
+        JobType.APPLY_UPDATES,
+        update.dataset,
+        {"update": str(update.id), "record_ids": record_ids},
+        total=len(record_ids),
+        github_login=_github_login(),
+    )
+    return redirect(url_for("upload.job_status", dataset=dataset, job=job.id))
 
-    update.status = UpdateStatus.COMPLETE
-    db.session.add(update)
-    db.session.commit()
 
-    return redirect(url_for("main.dataset", id=dataset.dataset))
+@upload.route("/dataset/<string:dataset>/jobs/<string:job>")
+def job_status(dataset, job):
+    job = _get_job(dataset, job)
+    return render_template(
+        "job.html", job=job, dataset=job.dataset, next_url=_job_next_url(job)
+    )
+
+
+@upload.route("/dataset/<string:dataset>/jobs/<string:job>.json")
+def job_status_json(dataset, job):
+    job = _get_job(dataset, job)
+    return {**job.to_dict(), "next": _job_next_url(job)}
 
 
 @upload.route(
     "/dataset/<string:dataset>/process-updates/<string:update>/cancel", methods=["GET"]
 )
 def cancel_updates(dataset, update):
-    update = Update.query.filter(
-        Update.id == update,
-        Update.dataset_id == dataset,
-        Update.status == UpdateStatus.PENDING,
-    ).one_or_none()
-    if update is None:
-        return abort(404, f"No update found for this {dataset}")
+    update = _get_pending_update(dataset, update)
 
     update.status = UpdateStatus.CANCELLED
     for record in update.records:
@@ -310,19 +186,46 @@ def cancel_updates(dataset, update):
     return redirect(url_for("main.dataset", id=dataset))
 
 
-def _check_update(record, current_record, fields, change_log):
-    if set(record.keys()) != set(fields):
-        return {"error": "The fields don't match the specification"}
+def _github_login():
+    return session.get("user", {}).get("login")
+
+
+def _get_pending_update(dataset, update_id):
+    try:
+        update_id = uuid.UUID(update_id)
+    except ValueError:
+        abort(404, f"No update found for this {dataset}")
+    update = Update.query.filter(
+        Update.id == update_id,
+        Update.dataset_id == dataset,
+        Update.status == UpdateStatus.PENDING,
+    ).one_or_none()
+    if update is None:
+        abort(404, f"No update found for this {dataset}")
+    return update
 
-    changes = {}
-    excluded = set(["entity", "prefix", "reference", "end-date", "entry-date"])
-    for key, new_value in record.items():
-        if key not in excluded:
-            current_value = current_record.get(key)
-            if current_value != new_value:
-                changes[key] = f"Updated from '{current_value}' to '{new_value}'"
 
-    return changes
+def _get_job(dataset, job_id):
+    try:
+        job_id = uuid.UUID(job_id)
+    except ValueError:
+        abort(404)
+    job = Job.query.filter(Job.id == job_id, Job.dataset_id == dataset).one_or_none()
+    if job is None:
+        abort(404)
+    return job
+
+
+def _job_next_url(job):
+    if job.status != JobStatus.COMPLETE:
+        return None
+    if job.job_type == JobType.UPDATE:
+        return url_for(
+            "upload.process_updates",
+            dataset=job.dataset_id,
+            update=job.result["update"],
+        )
+    return url_for("main.dataset", id=job.dataset_id)
 
 
 def _allowed_file(filename):
@@ -1,29 +1,31 @@
 import base64
-import csv
 import datetime
-import hashlib
 import os
-from pathlib import Path
+import time
+from urllib.parse import urlencode
 
 import click
-import frontmatter
 import github
-import requests
+from flask import current_app
 from flask.cli import AppGroup
 
 from application.extensions import db
-from application.models import Dataset, Field, Record, Reference
+from application.http_client import HttpClient
+from application.jobs import claim_next, run
+from application.models import Dataset, Field, Reference
+from application.platform import refresh_platform_status
+from application.query_plans import check_query_plans
+from application.registers import (
+    REGISTERS_DIR,
+    export_registers,
+    push_changed_registers,
+)
+from application.specification import get_specification
 
 data_cli = AppGroup("data")
 
-base_git_content_url = "https://raw.githubusercontent.com/digital-land"
-specfication_markdown_url = (
-    "{base_git_content_url}/specification/main/content/dataset/{dataset}.md"
-)
-
 datasette_url = "https://datasette.planning.data.gov.uk/digital-land"
-field_query = "{datasette_url}/field.json?field__exact={field}&_shape=object"
-fields_query = f"{datasette_url}/field.json?_shape=array"
+fields_query = f"{datasette_url}/field.json?_shape=objects&_size=max"
 dataset_query_part = "dataset__not=category&realm__exact=dataset&typology__exact=category&_shape=array"  # noqa
 dataset_query = f"{datasette_url}/dataset.json?{dataset_query_part}"
 dataset_field_query = (
@@ -35,12 +37,10 @@ dataset_replacement_query = (
 dataset_editor_base_url = "https://dataset-editor.development.planning.data.gov.uk"
 
 
-dataset_field_field_query = (
-    "{datasette_url}/dataset_field.json?field__exact={dataset}&_shape=array"  # noqa
+dataset_field_table = f"{datasette_url}/dataset_field.json?_shape=objects&_size=max"
+specification_dataset_table = (
+    f"{datasette_url}/specification_dataset.json?_shape=objects&_size=max"
 )
-dataset_field_field_dataset_query = "{datasette_url}/dataset_field.json?field_dataset__exact={dataset}&_shape=array"  # noqa
-
-specification_dataset_query = "{datasette_url}/specification_dataset.json?dataset__exact={dataset}&_shape=array"  # noqa
 
 
 platform_dataset_query = (
@@ -51,53 +51,78 @@ platform_dataset_query = (
 @data_cli.command("dataset-fields")
 def dataset_fields():
     print("loading dataset fields")
-    for dataset in Dataset.query.all():
-        schema_url = specfication_markdown_url.format(
-            base_git_content_url=base_git_content_url, dataset=dataset.dataset
-        )
-        markdown = requests.get(schema_url)
-        if markdown.status_code == 200:
-            front = frontmatter.loads(markdown.text)
-            fields = [field["field"] for field in front["fields"]]
-            updated_fields = [field for field in fields if field != dataset.name]
-
-            for field in updated_fields:
-                f = Field.query.get(field)
-                if f is None:
-                    human_readable = field.replace("-", " ").capitalize()
-                    f = Field(field=field, name=human_readable)
-                    query = field_query.format(datasette_url=datasette_url, field=field)
-                    resp = requests.get(query)
-                    data = resp.json()
-                    f.datatype = data[field]["datatype"]
-                    if data[field].get("description"):
-                        f.description = data[field]["description"]
-                    db.session.add(f)
-                    db.session.commit()
-                    print(f"new field {f.field} added to {dataset.dataset}")
-
-                if f not in dataset.fields:
-                    dataset.fields.append(f)
-                    db.session.add(dataset)
-                    db.session.commit()
-                    print(f"field {f.field} added to {dataset.dataset}")
-                else:
-                    print(f"field {f.field} already in schema for {dataset.dataset}")
-        else:
+    client = HttpClient()
+    config = current_app.config
+    datasets = Dataset.query.all()
+    specifications = client.map(
+        lambda dataset_id: get_specification(client, dataset_id, config),
+        [dataset.dataset for dataset in datasets],
+    )
+
+    fields = {field.field: field for field in Field.query.all()}
+    spec_fields = {}
+    for dataset, (_, front) in zip(datasets, specifications):
+        if front is not None:
+            spec_fields[dataset.dataset] = [
+                field["field"]
+                for field in front["fields"]
+                if field["field"] != dataset.name
+            ]
+
+    # one datasette query for the definitions of all fields not in the db yet
+    new_fields = sorted(
+        {field for names in spec_fields.values() for field in names} - set(fields)
+    )
+    definitions = _get_field_definitions(client, new_fields)
+    for field in new_fields:
+        if field not in definitions:
+            print(f"no definition found for field {field}")
+            continue
+        human_readable = field.replace("-", " ").capitalize()
+        f = Field(field=field, name=human_readable)
+        f.datatype = definitions[field]["datatype"]
+        if definitions[field].get("description"):
+            f.description = definitions[field]["description"]
+        db.session.add(f)
+        fields[field] = f
+        print(f"new field {f.field} added")
+
+    for dataset, (schema_url, _) in zip(datasets, specifications):
+        if dataset.dataset not in spec_fields:
             print(f"no markdown file found at {schema_url}")
+            continue
+        current = {f.field for f in dataset.fields}
+        for field in spec_fields[dataset.dataset]:
+            if field not in fields:
+                continue
+            if field in current:
+                print(f"field {field} already in schema for {dataset.dataset}")
+            else:
+                dataset.fields.append(fields[field])
+                current.add(field)
+                print(f"field {field} added to {dataset.dataset}")
+    db.session.commit()
 
     print("db loaded")
+    print(client.report())
+
+
+def _get_field_definitions(client, fields):
+    if not fields:
+        return {}
+    query = f"{fields_query}&{urlencode({'field__in': ','.join(fields)})}"
+    return {row["field"]: row for row in _datasette_rows(client, query)}
 
 
 @data_cli.command("new-datasets")
 def get_new_datasets():
+    client = HttpClient()
     database_datasets = set([dataset.dataset for dataset in Dataset.query.all()])
 
-    resp = requests.get(dataset_replacement_query)
-    replacement_datasets = resp.json()
-
-    resp = requests.get(dataset_query)
-    data = resp.json()
+    replacement_datasets, data = [
+        resp.json()
+        for resp in client.map(client.get, [dataset_replacement_query, dataset_query])
+    ]
     new_datasets = [
         dataset
         for dataset in data
@@ -110,7 +135,7 @@ def get_new_datasets():
     # processing of replacements
     if new_datasets:
         print("New datasets found")
-        _process_new_datasets(new_datasets)
+        _process_new_datasets(new_datasets, client)
     else:
         print("No new datasets found")
 
@@ -122,6 +147,8 @@ def get_new_datasets():
     if ended_datasets:
         _process_ended_datasets(ended_datasets)
 
+    print(client.report())
+
 
 def _process_ended_datasets(ended_datasets):
     for dataset in ended_datasets:
@@ -192,15 +219,15 @@ def _process_replacement_datasets(replacement_datasets):
                 )
 
 
-def _process_new_datasets(new_datasets):
-    for dataset in new_datasets:
-        schema_url = specfication_markdown_url.format(
-            base_git_content_url=base_git_content_url, dataset=dataset["dataset"]
-        )
+def _process_new_datasets(new_datasets, client):
+    config = current_app.config
+    specifications = client.map(
+        lambda dataset_id: get_specification(client, dataset_id, config),
+        [dataset["dataset"] for dataset in new_datasets],
+    )
+    for dataset, (_, front) in zip(new_datasets, specifications):
         dataset = Dataset(dataset=dataset["dataset"], name=dataset["name"])
-        markdown = requests.get(schema_url)
-        if markdown.status_code == 200:
-            front = frontmatter.loads(markdown.text)
+        if front is not None:
             dataset.entity_minimum = int(front.get("entity-minimum"))
             dataset.entity_maximum = int(front.get("entity-maximum"))
             dataset.consideration = front.get("consideration")
@@ -209,7 +236,7 @@ def _process_new_datasets(new_datasets):
         db.session.commit()
         print(f"dataset {dataset.dataset} with name {dataset.name} added")
         print(f"get fields for {dataset.dataset}")
-        for field in front.get("fields"):
+        for field in front.get("fields") if front is not None else []:
             f = Field.query.get(field["field"])
             if f is None:
                 human_readable = field["field"].replace("-", " ").capitalize()
@@ -227,34 +254,65 @@ def _process_new_datasets(new_datasets):
         print("New datasets added to database")
 
 
-@data_cli.command("backup-registers")
-def backup_registers():
-    print("backing up registers")
-    subquery = (
-        db.session.query(Record.dataset_id)
-        .filter(Record.dataset_id == Dataset.dataset)
-        .exists()
-    )
+@data_cli.command("worker")
+@click.option("--once", is_flag=True, help="Exit when there are no pending jobs")
+@click.option("--poll-interval", default=5.0, help="Seconds to wait between polls")
+def worker(once, poll_interval):
+    print("worker started")
+    while True:
+        job = claim_next()
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        print(f"running {job.job_type.value} job {job.id} for {job.dataset_id}")
+        run(job)
+        print(f"job {job.id} {job.status.value.lower()}")
+    print("worker stopped")
+
+
+@data_cli.command("check-query-plans")
+def check_plans():
+    print("checking query plans")
+    failed = []
+    for name, (plan, scanned) in check_query_plans().items():
+        print(f"{name}:")
+        for line in plan:
+            print(f"  {line}")
+        if scanned:
+            failed.append(name)
+            print(f"  sequential scan on {', '.join(sorted(scanned))}")
+    if failed:
+        raise click.ClickException(f"sequential scans in: {', '.join(failed)}")
+    print("all key queries use an index")
+
+
+@data_cli.command("check-platform")
+def check_platform():
+    print("checking datasets on the platform")
     datasets = (
-        db.session.query(Dataset)
+        db.session.query(Dataset.dataset)
         .filter(Dataset.end_date.is_(None))
-        .filter(subquery)
         .order_by(Dataset.dataset)
-        .all()
     )
-    for dataset in datasets:
-        fields = [field.field for field in dataset.sorted_fields()]
-        data_dir = Path(__file__).resolve().parent.parent / "data/registers"
-        file_path = data_dir / f"{dataset.dataset}.csv"
-        records = [record.to_dict() for record in dataset.records]
-        try:
-            with open(file_path, "w") as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fields)
-                writer.writeheader()
-                writer.writerows(records)
-            print(f"backed up {dataset.dataset} to {file_path}")
-        except Exception as e:
-            print(f"failed to backup {dataset} to {file_path} with error {e}")
+    for (dataset_id,) in datasets.all():
+        available = refresh_platform_status(dataset_id)
+        print(f"{dataset_id}: {'available' if available else 'not found'}")
+
+
+@data_cli.command("backup-registers")
+@click.option("--workers", default=4, help="Number of registers to export at once")
+@click.option("--force", is_flag=True, help="Export registers even if unchanged")
+def backup_registers(workers, force):
+    print("backing up registers")
+    for dataset, status, detail in export_registers(REGISTERS_DIR, workers, force):
+        if status == "exported":
+            print(f"backed up {dataset} to {detail}")
+        elif status == "unchanged":
+            print(f"no changes to {dataset}")
+        else:
+            print(f"failed to backup {dataset} with error {detail}")
     print("registers backed up")
 
 
@@ -262,38 +320,14 @@ def backup_registers():
 def push_registers():
     registers_path = os.getenv("DATASETS_REPO_REGISTERS_PATH")
     repo = _get_repo(os.environ)
-    local_registers_directory = (
-        Path(__file__).resolve().parent.parent / "data/registers"
-    )
     print("Pushing registers to repo", repo, "and path", registers_path)
-    datasets = Dataset.query.all()
-    for dataset in datasets:
-        csv_file = f"{dataset.dataset}.csv"
-        local_file_path = os.path.join(local_registers_directory, csv_file)
-        try:
-            with open(local_file_path, "r") as f:
-                local_content = f.read()
-        except FileNotFoundError:
-            print(f"Local file {local_file_path} not found. Skipping.")
-            continue
-
-        remote_path_file_path = f"{registers_path}/{csv_file}"
-        remote_file, remote_content = _get_file_contents(repo, remote_path_file_path)
-
-        if remote_file is None and remote_content is None:
-            print(f"push new file {csv_file}")
-            _commit_new(repo, remote_path_file_path, local_content)
-
-        elif remote_file is not None and remote_content is not None:
-            local_content_hash = _get_sha256(local_content)
-            remote_content_hash = _get_sha256(remote_content)
-            if local_content_hash != remote_content_hash:
-                print(f"update file {remote_path_file_path}")
-                _commit_update(repo, remote_file, local_content)
-            else:
-                print(f"No changes to {csv_file}")
-        else:
-            print(f"Error getting remote file {csv_file}. Skipping.")
+    pushed, commit = push_changed_registers(repo, registers_path, REGISTERS_DIR)
+    if commit is None:
+        print("No changes to registers")
+        return
+    for path in pushed:
+        print(f"update file {path}")
+    print(f"Committed {len(pushed)} registers to remote repo in {commit.sha}")
 
 
 @data_cli.command("backup-push-registers")
@@ -379,14 +413,16 @@ def load_db_backup():
 @data_cli.command("set-considerations")
 def set_dataset_considerations():
     print("Setting considerations for datasets")
-    for dataset in Dataset.query.filter(Dataset.consideration.is_(None)).all():
+    client = HttpClient()
+    config = current_app.config
+    datasets = Dataset.query.filter(Dataset.consideration.is_(None)).all()
+    specifications = client.map(
+        lambda dataset_id: get_specification(client, dataset_id, config),
+        [dataset.dataset for dataset in datasets],
+    )
+    for dataset, (_, front) in zip(datasets, specifications):
         print(f"Consideration for {dataset.dataset} is not set")
-        schema_url = specfication_markdown_url.format(
-            base_git_content_url=base_git_content_url, dataset=dataset.dataset
-        )
-        markdown = requests.get(schema_url)
-        if markdown.status_code == 200:
-            front = frontmatter.loads(markdown.text)
+        if front is not None:
             consideration = front.get("consideration")
             if consideration and consideration.strip() != "":
                 dataset.consideration = consideration
@@ -396,111 +432,92 @@ def set_dataset_considerations():
             else:
                 print(f"No consideration found for {dataset.dataset}")
     print("Done")
+    print(client.report())
 
 
 @data_cli.command("set-references")
 def set_dataset_references():
     print("Setting references for datasets")
+    client = HttpClient()
 
-    refs = {}
+    datasets = [dataset.dataset for dataset in Dataset.query.order_by(Dataset.dataset)]
+    dataset_fields = list(_datasette_rows(client, dataset_field_table))
+    specification_datasets = list(_datasette_rows(client, specification_dataset_table))
 
-    for dataset in Dataset.query.order_by(Dataset.dataset).all():
-        try:
-            resp = requests.get(
-                dataset_field_field_dataset_query.format(
-                    datasette_url=datasette_url, dataset=dataset.dataset
-                )
-            )
-            resp.raise_for_status()
-            data = resp.json()
-
-            for d in data:
-                referenced_by = d.get("dataset")
-                if not referenced_by:
-                    print(f"No references found for {dataset.dataset}")
-                    continue
-
-                if dataset.dataset in refs:
-                    refs[dataset.dataset].append(
-                        {"referenced_by": referenced_by, "specification": None}
-                    )
-                else:
-                    refs[dataset.dataset] = [
-                        {"referenced_by": referenced_by, "specification": None}
-                    ]
-
-            resp = requests.get(
-                dataset_field_field_query.format(
-                    datasette_url=datasette_url, dataset=dataset.dataset
-                )
+    refs = {}
+    for dataset_id in datasets:
+        # fields whose values are entities of the dataset, then fields named
+        # after the dataset
+        rows = [row for row in dataset_fields if row.get("field_dataset") == dataset_id]
+        rows += [row for row in dataset_fields if row.get("field") == dataset_id]
+        for row in rows:
+            referenced_by = row.get("dataset")
+            if not referenced_by:
+                print(f"No references found for {dataset_id}")
+                continue
+            refs.setdefault(dataset_id, []).append(
+                {"referenced_by": referenced_by, "specification": None}
             )
-            resp.raise_for_status()
-            data = resp.json()
-
-            for d in data:
-                referenced_by = d.get("dataset")
-                if not referenced_by:
-                    print(f"No references found for {dataset.dataset}")
-                    continue
-
-                if dataset.dataset in refs:
-                    refs[dataset.dataset].append(
-                        {"referenced_by": referenced_by, "specification": None}
-                    )
-                else:
-                    refs[dataset.dataset] = [
-                        {"referenced_by": referenced_by, "specification": None}
-                    ]
 
-        except requests.exceptions.HTTPError as e:
-            print(f"Error setting references for {dataset.dataset}: {e}")
-            continue
+    # the first specification listing each dataset
+    specifications = {}
+    for row in specification_datasets:
+        specifications.setdefault(row.get("dataset"), row.get("specification"))
 
     for d, r in refs.items():
         print(f"References for {d}")
         for ref in r:
-            resp = requests.get(
-                specification_dataset_query.format(
-                    datasette_url=datasette_url, dataset=ref["referenced_by"]
-                )
-            )
-            resp.raise_for_status()
-            specification_data = resp.json()
-            if not specification_data:
+            if ref["referenced_by"] not in specifications:
                 print(f"No specification found for {ref['referenced_by']}")
             else:
-                specification = specification_data[0].get("specification")
+                specification = specifications[ref["referenced_by"]]
                 ref["specification"] = specification
                 print(f"Specification {specification} found for {ref['referenced_by']}")
 
+    # a reference without a specification matches any existing reference
+    # from the same dataset
+    existing = {
+        (reference.dataset_id, reference.referenced_by, reference.specification)
+        for reference in Reference.query.all()
+    }
+    existing_pairs = {(d, referenced_by) for d, referenced_by, _ in existing}
     for d, r in refs.items():
         for ref in r:
             referenced_by = ref["referenced_by"]
             specification = ref["specification"]
             if specification is None:
-                reference = Reference.query.filter(
-                    Reference.dataset_id == d, Reference.referenced_by == referenced_by
-                ).one_or_none()
+                found = (d, referenced_by) in existing_pairs
             else:
-                reference = Reference.query.filter(
-                    Reference.dataset_id == d,
-                    Reference.referenced_by == referenced_by,
-                    Reference.specification == specification,
-                ).one_or_none()
-
-            if reference is None:
-                reference = Reference(
-                    dataset_id=d,
-                    referenced_by=referenced_by,
-                    specification=specification,
+                found = (d, referenced_by, specification) in existing
+            if not found:
+                db.session.add(
+                    Reference(
+                        dataset_id=d,
+                        referenced_by=referenced_by,
+                        specification=specification,
+                    )
                 )
-                db.session.add(reference)
-                db.session.commit()
+                existing.add((d, referenced_by, specification))
+                existing_pairs.add((d, referenced_by))
                 print(
                     f"Reference {referenced_by} with specification {specification} added to {d}"
                 )
+    db.session.commit()
 
     print("Done")
+    print(client.report())
+
+
+def _datasette_rows(client, url):
+    """
+    Every row of a datasette table, following its next_url page links.
+    """
+    while url:
+        resp = client.get(url)
+        resp.raise_for_status()
+        data = resp.json()
+        yield from data["rows"]
+        url = data.get("next_url")
 
 
 def _get_repo(config):
@@ -514,28 +531,3 @@ def _get_repo(config):
     installation_id = gi.get_installations()[0].id
     gh = gi.get_github_for_installation(installation_id)
     return gh.get_repo(repo_name)
-
-
-def _get_sha256(content):
-    return hashlib.sha256(content.encode("utf-8")).hexdigest()
-
-
-def _get_file_contents(repo, file_path):
-    try:
-        file = repo.get_contents(file_path)
-        file_content = file.decoded_content.decode("utf-8")
-        return file, file_content
-    except github.UnknownObjectException as e:
-        print(f"File {file_path} is not on remote repo")
-        print(e)
-        return None, None
-
-
-def _commit_update(repo, file, contents, message="Updated dataset registers"):
-    repo.update_file(file.path, message, contents, file.sha)
-    print(f"Committed {file.path} to remote repo")
-
-
-def _commit_new(repo, file_path, contents, message="New dataset registers"):
-    repo.create_file(file_path, message, contents)
-    print(f"Created new {file_path} on remote repo")
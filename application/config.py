@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -17,13 +18,38 @@ class Config:
     DEBUG = False
     GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
     GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
+    # overridable so a local stub server can stand in for GitHub
+    GITHUB_URL = os.getenv("GITHUB_URL", "https://github.com")
+    GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "10"))
+    # seconds an org membership check is reused for, 0 to check every login
+    GITHUB_MEMBERSHIP_TTL = int(os.getenv("GITHUB_MEMBERSHIP_TTL", "600"))
     SAFE_URLS = set(os.getenv("SAFE_URLS", "").split(","))
     AUTHENTICATION_ON = True
     DATASETS_REPO_NAME = os.getenv("DATASETS_REPO_NAME")
     DATASETS_REPO_REGISTERS_PATH = os.getenv("DATASETS_REPO_REGISTERS_PATH")
     SPECIFICATION_REPO_URL = os.getenv("SPECIFICATION_REPO_URL")
+    # a local checkout of the specification repo to read dataset markdown
+    # from, otherwise it's fetched from GitHub and cached on disk
+    SPECIFICATION_PATH = os.getenv("SPECIFICATION_PATH")
+    SPECIFICATION_CACHE_DIR = os.getenv(
+        "SPECIFICATION_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "dluhc-datasets", "specification"),
+    )
+    SPECIFICATION_CACHE_MAX_AGE = int(os.getenv("SPECIFICATION_CACHE_MAX_AGE", "600"))
     PLATFORM_URL = os.getenv("PLATFORM_URL")
     PLANNING_DATA_DESIGN_URL = os.getenv("PLANNING_DATA_DESIGN_URL")
+    # how long a dataset's platform availability is trusted, and how long to
+    # wait for the platform when checking it
+    PLATFORM_CHECK_TTL = int(os.getenv("PLATFORM_CHECK_TTL", "3600"))
+    PLATFORM_CHECK_TIMEOUT = float(os.getenv("PLATFORM_CHECK_TIMEOUT", "3"))
+    PLATFORM_CHECK_IN_BACKGROUND = True
+    # run upload and update jobs in the request rather than `flask data worker`
+    JOBS_INLINE = os.getenv("JOBS_INLINE", "false").lower() == "true"
+    # a running job with no progress for this many seconds is claimed again,
+    # up to JOB_MAX_ATTEMPTS starts in all
+    JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "900"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
     WIKIDATA_PREFIX_DATASETS = set(
         [
             "development-corporation",
@@ -53,3 +79,5 @@ class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = False
+    JOBS_INLINE = True
+    PLATFORM_CHECK_IN_BACKGROUND = False
@@ -0,0 +1,168 @@
+"""
+Allocation of entity numbers within a dataset's entity_minimum to
+entity_maximum range, and of record row_ids.
+
+Each dataset has an EntitySequence row holding its next unallocated entity
+and row_id. Both are reserved with a single UPDATE ... RETURNING on that row.
+The row stays locked until the reserving transaction ends, so concurrent
+editors and uploads are never handed the same entity or row_id. Jobs reserve
+in a transaction of their own (see allocation_session), so editors only wait
+for the reservation rather than the whole job.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from application.extensions import db
+from application.models import EntitySequence, Record
+
+
+@contextmanager
+def allocation_session():
+    """
+    A session that is committed as soon as the block ends, for long running
+    jobs to reserve entities in. Entities reserved by a job that then fails
+    are skipped. On SQLite the job's own session is used instead, for the
+    reason given in jobs._write_progress.
+    """
+    if _shares_connection():
+        yield db.session
+        return
+    with Session(db.engine) as session, session.begin():
+        yield session
+
+
+def _shares_connection():
+    return db.engine.dialect.name == "sqlite"
+
+
+def _initial_entity(dataset, session):
+    max_entity = (
+        session.query(func.max(Record.entity))
+        .filter(Record.dataset_id == dataset.dataset)
+        .scalar()
+    )
+    first = dataset.entity_minimum if dataset.entity_minimum is not None else 1
+    if max_entity is not None and max_entity >= first:
+        return max_entity + 1
+    return first
+
+
+def _ensure_sequence(dataset, session):
+    exists = session.execute(
+        select(EntitySequence.dataset_id).where(
+            EntitySequence.dataset_id == dataset.dataset
+        )
+    ).first()
+    if exists:
+        return
+    try:
+        with session.begin_nested():
+            session.execute(
+                insert(EntitySequence).values(
+                    dataset_id=dataset.dataset,
+                    next_entity=_initial_entity(dataset, session),
+                )
+            )
+    except IntegrityError:
+        # created by a concurrent transaction
+        pass
+
+
+def reserve_entities(dataset, count=1, after=None, session=None):
+    """
+    Reserve count consecutive entities for dataset and return them as a range.
+    If after is given the block starts beyond it, which also moves the
+    sequence past entities that were supplied rather than allocated. The
+    reservation is made in session, by default the app's.
+
+    Raises ValueError if the block would go past entity_maximum.
+    """
+    session = session or db.session
+    _ensure_sequence(dataset, session)
+    start = EntitySequence.next_entity
+    if after is not None:
+        start = case(
+            (EntitySequence.next_entity > after, EntitySequence.next_entity),
+            else_=after + 1,
+        )
+    statement = update(EntitySequence).where(
+        EntitySequence.dataset_id == dataset.dataset
+    )
+    if count and dataset.entity_maximum is not None:
+        statement = statement.where(start + count - 1 <= dataset.entity_maximum)
+    next_entity = session.execute(
+        statement.values(next_entity=start + count).returning(
+            EntitySequence.next_entity
+        ),
+        execution_options={"synchronize_session": False},
+    ).scalar()
+    if next_entity is None:
+        raise ValueError(
+            f"Not enough entities left in range {dataset.entity_minimum} to "
+            f"{dataset.entity_maximum} for {count} records"
+        )
+    return range(next_entity - count, next_entity)
+
+
+def reserve_row_ids(dataset, count=1, session=None):
+    """
+    Reserve count consecutive row_ids for new records in dataset and return
+    them as a range, made in session as for reserve_entities. The first
+    reservation starts after the dataset's highest row_id.
+    """
+    session = session or db.session
+    _ensure_sequence(dataset, session)
+    after_records = (
+        select(func.max(Record.row_id) + 1)
+        .where(Record.dataset_id == dataset.dataset)
+        .scalar_subquery()
+    )
+    start = func.coalesce(EntitySequence.next_row_id, after_records, 0)
+    next_row_id = session.execute(
+        update(EntitySequence)
+        .where(EntitySequence.dataset_id == dataset.dataset)
+        .values(next_row_id=start + count)
+        .returning(EntitySequence.next_row_id),
+        execution_options={"synchronize_session": False},
+    ).scalar()
+    return range(next_row_id - count, next_row_id)
+
+
+def claim_entity(dataset, entity):
+    """
+    Allocate a specific entity, moving the sequence past it. Raises ValueError
+    if a record in the dataset already has the entity.
+    """
+    reserve_entities(dataset, 0, after=entity)
+    taken = (
+        db.session.query(Record.id)
+        .filter(Record.dataset_id == dataset.dataset, Record.entity == entity)
+        .first()
+    )
+    if taken is not None:
+        raise ValueError(f"entity {entity} is already in use")
+    return entity
+
+
+def next_entity(dataset):
+    """
+    The entity the next reservation would start at, without reserving it.
+    """
+    current = db.session.execute(
+        select(EntitySequence.next_entity).where(
+            EntitySequence.dataset_id == dataset.dataset
+        )
+    ).scalar()
+    return current if current is not None else _initial_entity(dataset, db.session)
+
+
+def remaining_entities(dataset):
+    """
+    How many entities are left to allocate, or None if the range is open ended.
+    """
+    if dataset.entity_maximum is None:
+        return None
+    return max(dataset.entity_maximum - next_entity(dataset) + 1, 0)
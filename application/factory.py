@@ -69,11 +69,11 @@ def register_extensions(app):
         name="github",
         client_id=app.config["GITHUB_CLIENT_ID"],
         client_secret=app.config["GITHUB_CLIENT_SECRET"],
-        access_token_url="https://github.com/login/oauth/access_token",
+        access_token_url=f"{app.config['GITHUB_URL']}/login/oauth/access_token",
         access_token_params=None,
-        authorize_url="https://github.com/login/oauth/authorize",
+        authorize_url=f"{app.config['GITHUB_URL']}/login/oauth/authorize",
         authorize_params=None,
-        api_base_url="https://api.github.com/",
+        api_base_url=f"{app.config['GITHUB_API_URL']}/",
         client_kwargs={"scope": "user:email read:org"},
     )
 
@@ -0,0 +1,91 @@
+"""
+In-process typeahead index over the active records of a dataset, for the
+category finder.
+
+Each index holds the records' names, descriptions and references in name
+order, and a sorted list of the words in their names and references so a
+prefix can be looked up with bisect. Indexes are cached per dataset and
+rebuilt when the dataset's version or modified time moves on, which they do
+on any change to the dataset or its records.
+"""
+
+import bisect
+import re
+import threading
+
+from application.models import Record
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _words(value):
+    return re.findall(r"\w+", (value or "").casefold())
+
+
+class FinderIndex:
+    def __init__(self, records):
+        self.entries = sorted(
+            (
+                {
+                    "entity": record.entity,
+                    "name": record.data.get("name") or "",
+                    "description": record.description,
+                    "reference": record.reference,
+                }
+                for record in records
+            ),
+            key=lambda entry: (entry["name"].casefold(), entry["reference"] or ""),
+        )
+        postings = {}
+        for position, entry in enumerate(self.entries):
+            for word in _words(entry["name"]) + _words(entry["reference"]):
+                postings.setdefault(word, set()).add(position)
+        self.words = sorted(postings)
+        self.postings = [postings[word] for word in self.words]
+
+    def _prefixed(self, prefix):
+        positions = set()
+        start = bisect.bisect_left(self.words, prefix)
+        for i in range(start, len(self.words)):
+            if not self.words[i].startswith(prefix):
+                break
+            positions |= self.postings[i]
+        return positions
+
+    def search(self, q, limit=None, offset=0):
+        """
+        Entries with a word starting with each word of q, in name order, and
+        the total number of matches. An empty q matches every entry.
+        """
+        matches = None
+        for prefix in _words(q):
+            positions = self._prefixed(prefix)
+            matches = positions if matches is None else matches & positions
+            if not matches:
+                return [], 0
+        if matches is None:
+            entries = self.entries
+        else:
+            entries = [self.entries[position] for position in sorted(matches)]
+        end = None if limit is None else offset + limit
+        return entries[offset:end], len(entries)
+
+
+def finder_index(dataset):
+    """
+    The FinderIndex for the dataset's current version, building it if needed.
+    """
+    key = (dataset.version, dataset.modified)
+    with _indexes_lock:
+        cached = _indexes.get(dataset.dataset)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    records = Record.query.filter(
+        Record.dataset_id == dataset.dataset, Record.end_date.is_(None)
+    )
+    index = FinderIndex(records)
+    with _indexes_lock:
+        _indexes[dataset.dataset] = (key, index)
+    return index
@@ -1,7 +1,18 @@
+import hashlib
+import json
+import threading
+
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileRequired
 from wtforms import IntegerField, StringField, TextAreaField, URLField
-from wtforms.validators import URL, DataRequired, ValidationError, Optional
+from wtforms.validators import URL, DataRequired, Optional, ValidationError
+
+from application.models import Field
+
+# (dataset, include_edit_notes, require_reference) ->
+# (schema hash, form class, field names in display order)
+_form_cache = {}
+_form_cache_lock = threading.Lock()
 
 
 # change to a regex validator
@@ -29,6 +40,40 @@ class FormBuilder:
     }
 
     def build(self):
+        return self._cached()[1]()
+
+    def form_fields(self):
+        by_field = {field.field: field for field in self.fields}
+        return [by_field[field] for field in self._cached()[2]]
+
+    def _cached(self):
+        """
+        The generated form class and field order, cached per dataset and flags
+        and rebuilt when the hash of the field definitions changes.
+        """
+        if self._entry is not None:
+            return self._entry
+        schema = hashlib.sha256(
+            json.dumps(
+                [
+                    [(field.field, field.datatype) for field in self.fields],
+                    self.include_edit_notes,
+                    self.require_reference,
+                ]
+            ).encode("utf-8")
+        ).hexdigest()
+        key = (self.dataset, self.include_edit_notes, self.require_reference)
+        with _form_cache_lock:
+            entry = _form_cache.get(key)
+        if entry is None or entry[0] != schema:
+            order = [field.field for field in sorted(self.fields, key=Field.sort_key)]
+            entry = (schema, self._form_class(), order)
+            with _form_cache_lock:
+                _form_cache[key] = entry
+        self._entry = entry
+        return entry
+
+    def _form_class(self):
         class TheForm(FlaskForm):
             pass
 
@@ -53,16 +98,17 @@ class FormBuilder:
         if self.include_edit_notes:
             setattr(TheForm, "edit_notes", TextAreaField(validators=[DataRequired()]))
 
-        return TheForm()
-
-    def form_fields(self):
-        return sorted(self.fields)
+        return TheForm
 
-    def __init__(self, fields, include_edit_notes=False, require_reference=True):
+    def __init__(
+        self, fields, include_edit_notes=False, require_reference=True, dataset=None
+    ):
         skip_fields = {"entry-date", "prefix"}
         self.fields = []
         self.include_edit_notes = include_edit_notes
         self.require_reference = require_reference
+        self.dataset = dataset
+        self._entry = None
         for field in fields:
             if field.field not in skip_fields:
                 self.fields.append(field)
@@ -0,0 +1,325 @@
+"""
+Loading of register CSV uploads and updates.
+
+For uploads every Record and ChangeLog row is built in memory first and then
+written with batched INSERTs. None of these functions commit: the caller (see
+application.jobs) commits or rolls back the whole unit of work.
+"""
+import datetime
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import insert
+
+from application.entities import (
+    allocation_session,
+    reserve_entities,
+    reserve_row_ids,
+)
+from application.extensions import db
+from application.models import (
+    ChangeLog,
+    ChangeType,
+    Record,
+    Update,
+    UpdateRecord,
+    UpdateStatus,
+    create_change_log,
+)
+from application.utils import parse_date
+
+# rows per INSERT statement and entities per IN query
+BATCH_SIZE = 1000
+
+
+def _order_records(records):
+    def sort_key(item):
+        if item.get("end-date") is None or item.get("end-date") == "":
+            return datetime.date.max
+        else:
+            return item.get("end-date")
+
+    ordered = sorted(records, key=sort_key)
+    return ordered
+
+
+def group_rows(rows):
+    """
+    Group CSV rows by reference, parsing any date values.
+    """
+    records = OrderedDict()
+    for data in rows:
+        for key, value in data.items():
+            if "-date" in key:
+                data[key] = parse_date(value) if value else None
+        records.setdefault(data.get("reference"), []).append(data)
+    return records
+
+
+def build_records(dataset, rows, config, progress=None):
+    """
+    Build the Record for each reference in rows plus an EDIT ChangeLog for
+    every further row with that reference. Nothing is added to the session.
+
+    References without an entity are given one from a single block reserved
+    from the dataset's entity sequence, starting after any supplied entity.
+    The records' row_ids are reserved as one block too, and both blocks are
+    reserved in a transaction of their own (see allocation_session).
+    progress, if given, is called with 0 after every BATCH_SIZE references,
+    so a job's heartbeat keeps up while nothing is being written.
+    """
+    grouped = [_order_records(data) for data in group_rows(rows).values()]
+    supplied = [int(data["entity"]) for data in rows if data.get("entity")]
+    missing = sum(1 for ordered in grouped if not ordered[0].get("entity"))
+    with allocation_session() as session:
+        entities = iter(
+            reserve_entities(
+                dataset, missing, after=max(supplied, default=None), session=session
+            )
+        )
+        row_ids = reserve_row_ids(dataset, len(grouped), session=session)
+
+    records = []
+    change_logs = []
+    for built, (row_id, ordered) in enumerate(zip(row_ids, grouped), start=1):
+        original_record = ordered.pop(0)
+
+        if not original_record.get("entity"):
+            original_record["entity"] = next(entities)
+        else:
+            original_record["entity"] = int(original_record["entity"])
+
+        record = Record.factory(
+            row_id,
+            original_record.get("entity"),
+            dataset.dataset,
+            original_record,
+            config,
+        )
+        record.id = uuid.uuid4()
+        records.append(record)
+
+        for rest in ordered:
+            change_log = create_change_log(record, rest, ChangeType.EDIT)
+            change_log.dataset_id = dataset.dataset
+            change_logs.append(change_log)
+
+        if progress is not None and built % BATCH_SIZE == 0:
+            progress(0)
+
+    return records, change_logs
+
+
+def bulk_insert(model, objects, progress=None):
+    """
+    INSERT the column values of transient model instances in batches of
+    BATCH_SIZE. Columns left as None are omitted so their defaults apply.
+    progress, if given, is called with the size of each batch inserted.
+    """
+    columns = [column.key for column in model.__table__.columns]
+    rows = [
+        {
+            column: getattr(obj, column)
+            for column in columns
+            if getattr(obj, column) is not None
+        }
+        for obj in objects
+    ]
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start : start + BATCH_SIZE]
+        db.session.execute(insert(model), batch)
+        if progress is not None:
+            progress(len(batch))
+
+
+def ingest_csv(dataset, rows, config, progress=None):
+    """
+    Add CSV rows to dataset, flushing but not committing the inserts.
+    Returns counts and the rows per second achieved. progress, if given, is
+    called with the number of rows written by each batch.
+    """
+    started = time.perf_counter()
+    records, change_logs = build_records(dataset, rows, config, progress)
+    bulk_insert(Record, records, progress)
+    bulk_insert(ChangeLog, change_logs, progress)
+    dataset.last_updated = datetime.date.today()
+    db.session.add(dataset)
+    db.session.flush()
+    seconds = time.perf_counter() - started
+    return {
+        "rows": len(rows),
+        "records": len(records),
+        "change_logs": len(change_logs),
+        "seconds": seconds,
+        "rows_per_second": len(rows) / seconds if seconds else float(len(rows)),
+    }
+
+
+def stage_update(dataset, rows):
+    update = Update(dataset_id=dataset.dataset)
+    for row in rows:
+        update.records.append(UpdateRecord(data=row))
+    db.session.add(update)
+    return update
+
+
+def check_update(update, progress=None):
+    """
+    Work out the changes each update record would make to the current record
+    with the same entity, or mark it as a new record. Records that have
+    already been checked are skipped.
+
+    The current records are fetched with one IN query per batch of entities
+    and the dataset's fields are loaded once, rather than per update record.
+    progress, if given, is called with the size of each batch checked.
+    """
+    unchecked = []
+    for record in update.records:
+        if record.changes is not None or record.new_record:
+            continue
+        entity = record.data.get("entity")
+        if entity is None or entity.strip() == "":
+            raise ValueError("Missing entity in record")
+        unchecked.append((int(entity), record))
+    if not unchecked:
+        return
+
+    current_records = active_records_by_entity(
+        update.dataset_id, [entity for entity, _ in unchecked]
+    )
+    expected_fields = [field.field for field in update.dataset.fields]
+
+    for start in range(0, len(unchecked), BATCH_SIZE):
+        batch = unchecked[start : start + BATCH_SIZE]
+        for entity, record in batch:
+            current_record = current_records.get(entity)
+            if current_record is not None:
+                record.changes = _check_update(
+                    record.data, current_record.to_dict(), expected_fields
+                )
+            else:
+                record.new_record = True
+            db.session.add(record)
+        if progress is not None:
+            db.session.flush()
+            progress(len(batch))
+
+
+def active_records_by_entity(dataset_id, entities):
+    """
+    Map entity to the dataset's current (not ended) record for each entity.
+    """
+    entities = sorted(set(entities))
+    records = {}
+    for start in range(0, len(entities), BATCH_SIZE):
+        batch = entities[start : start + BATCH_SIZE]
+        for record in Record.query.filter(
+            Record.dataset_id == dataset_id,
+            Record.entity.in_(batch),
+            Record.end_date.is_(None),
+        ):
+            records[record.entity] = record
+    return records
+
+
+def apply_update(update, update_record_ids, config, github_login=None, progress=None):
+    """
+    Apply the selected update records to the dataset and complete the update.
+    Returns the number of records applied.
+
+    Existing records are loaded with one bulk entity lookup, new records get a
+    contiguous block of row_ids reserved in a transaction of their own (see
+    allocation_session), and new records and change logs are written with
+    batched INSERTs. Edits are logged as EDIT changes and new records as ADD
+    changes, as add_record does.
+    Each batch of BATCH_SIZE update records is written before the next is
+    built, and progress, if given, is called with its size.
+    """
+    if update.status != UpdateStatus.PENDING:
+        raise ValueError(f"Update {update.id} is {update.status.name.lower()}")
+
+    dataset = update.dataset
+    selected = [
+        update_record
+        for update_record in update.records
+        if str(update_record.id) in update_record_ids
+    ]
+    current_records = active_records_by_entity(
+        dataset.dataset,
+        [int(update_record.data["entity"]) for update_record in selected],
+    )
+
+    # keep the entity sequence ahead of entities added by the update
+    new_entities = [
+        int(update_record.data["entity"])
+        for update_record in selected
+        if int(update_record.data["entity"]) not in current_records
+    ]
+    row_ids = iter(())
+    if new_entities:
+        with allocation_session() as session:
+            reserve_entities(dataset, 0, after=max(new_entities), session=session)
+            row_ids = iter(reserve_row_ids(dataset, len(new_entities), session=session))
+
+    for start in range(0, len(selected), BATCH_SIZE):
+        batch = selected[start : start + BATCH_SIZE]
+        new_records = []
+        change_logs = []
+        for update_record in batch:
+            entity = int(update_record.data["entity"])
+            record = current_records.get(entity)
+            if record is not None:
+                change_log = create_change_log(
+                    record, update_record.data, ChangeType.EDIT, github_login
+                )
+                change_log.dataset_id = dataset.dataset
+                change_logs.append(change_log)
+            else:
+                record = Record.factory(
+                    next(row_ids),
+                    entity,
+                    dataset.dataset,
+                    dict(update_record.data),
+                    config,
+                )
+                record.id = uuid.uuid4()
+                new_records.append(record)
+                change_logs.append(
+                    ChangeLog(
+                        change_type=ChangeType.ADD,
+                        data=record.to_dict(),
+                        record_id=record.id,
+                        notes=f"Added record {record.prefix}:{record.reference}",
+                        dataset_id=dataset.dataset,
+                        github_login=github_login,
+                    )
+                )
+            update_record.processed = True
+
+        bulk_insert(Record, new_records)
+        bulk_insert(ChangeLog, change_logs)
+        if progress is not None:
+            db.session.flush()
+            progress(len(batch))
+
+    dataset.last_updated = datetime.date.today()
+    update.status = UpdateStatus.COMPLETE
+    db.session.add(dataset)
+    db.session.add(update)
+    return len(selected)
+
+
+def _check_update(record, current_record, fields):
+    if set(record.keys()) != set(fields):
+        return {"error": "The fields don't match the specification"}
+
+    changes = {}
+    excluded = set(["entity", "prefix", "reference", "end-date", "entry-date"])
+    for key, new_value in record.items():
+        if key not in excluded:
+            current_value = current_record.get(key)
+            if current_value != new_value:
+                changes[key] = f"Updated from '{current_value}' to '{new_value}'"
+
+    return changes
@@ -0,0 +1,202 @@
+"""
+Database backed queue for upload and update processing.
+
+The upload views stage their input in a Job row and return straight away. Jobs
+are run by `flask data worker`, or within the request when JOBS_INLINE is set
+(tests and local development without a worker).
+
+A job's changes are committed in one transaction when it finishes, but its
+progress is committed batch by batch on a separate connection. That count
+doubles as the job's heartbeat: a RUNNING job whose heartbeat is older than
+JOB_STALE_AFTER seconds is taken to belong to a worker that stopped, and is
+claimed again and run from the start.
+
+Each claim starts a new attempt. A run only commits its changes while its
+attempt is still the job's latest, checked under a lock on the job row, so
+if a slow but healthy worker is overtaken by a reclaim, only one of the two
+runs writes its records.
+"""
+import datetime
+import uuid
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from application.extensions import db
+from application.ingest import apply_update, check_update, ingest_csv, stage_update
+from application.models import Job, JobStatus, JobType, Update
+from application.utils import utc_now
+
+handlers = {}
+
+
+def handler(job_type):
+    def register(func):
+        handlers[job_type] = func
+        return func
+
+    return register
+
+
+@handler(JobType.UPLOAD)
+def _upload(job):
+    result = ingest_csv(
+        job.dataset, job.data["rows"], current_app.config, _progress(job)
+    )
+    job.processed = result["rows"]
+    return result
+
+
+@handler(JobType.UPDATE)
+def _update(job):
+    update = stage_update(job.dataset, job.data["rows"])
+    db.session.flush()
+    check_update(update, _progress(job))
+    job.processed = len(update.records)
+    return {"update": str(update.id)}
+
+
+@handler(JobType.APPLY_UPDATES)
+def _apply_updates(job):
+    update = db.session.get(Update, uuid.UUID(job.data["update"]))
+    if update is None:
+        raise ValueError(f"No update found for {job.dataset_id}")
+    applied = apply_update(
+        update,
+        set(job.data["record_ids"]),
+        current_app.config,
+        job.github_login,
+        _progress(job),
+    )
+    job.processed = applied
+    return {"update": str(update.id), "applied": applied}
+
+
+def enqueue(job_type, dataset, data, total=0, github_login=None):
+    job = Job(
+        dataset_id=dataset.dataset,
+        job_type=job_type,
+        data=data,
+        total=total,
+        github_login=github_login,
+    )
+    db.session.add(job)
+    db.session.commit()
+    if current_app.config.get("JOBS_INLINE", False):
+        _start(job)
+        run(job)
+    return job
+
+
+def claim_next():
+    """
+    Claim the oldest pending or stale running job, skipping any locked by
+    another worker. A stale job that has already been started
+    JOB_MAX_ATTEMPTS times is failed rather than run again.
+    """
+    stale = utc_now() - datetime.timedelta(
+        seconds=current_app.config["JOB_STALE_AFTER"]
+    )
+    while True:
+        job = (
+            Job.query.filter(
+                or_(
+                    Job.status == JobStatus.PENDING,
+                    and_(Job.status == JobStatus.RUNNING, Job.heartbeat < stale),
+                )
+            )
+            .order_by(Job.created)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.session.rollback()
+            return None
+        if job.attempts >= current_app.config["JOB_MAX_ATTEMPTS"]:
+            job.status = JobStatus.FAILED
+            job.error = "The worker stopped while running this job"
+            job.finished = utc_now()
+            db.session.commit()
+            continue
+        _start(job)
+        return job
+
+
+def run(job):
+    """
+    Run a claimed job. Its changes and final status are committed together,
+    or rolled back with the error recorded on the job. If the job has been
+    claimed again while it ran, its changes are rolled back and the job is
+    left to the newer attempt.
+    """
+    attempt = job.attempts
+    try:
+        result = handlers[job.job_type](job)
+        if not _owns(job.id, attempt):
+            db.session.rollback()
+            current_app.logger.warning(
+                f"job {job.id} was claimed again while attempt {attempt} ran"
+            )
+            return job
+        job.result = result
+        job.status = JobStatus.COMPLETE
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f"job {job.id} failed")
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+    job.finished = utc_now()
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _start(job):
+    job.status = JobStatus.RUNNING
+    job.started = utc_now()
+    job.heartbeat = job.started
+    job.attempts += 1
+    db.session.add(job)
+    db.session.commit()
+
+
+def _owns(job_id, attempt):
+    """
+    Whether attempt is still the job's latest, locking the job row until the
+    transaction ends so that it can't be claimed again before the commit.
+    """
+    latest = db.session.execute(
+        select(Job.attempts).where(Job.id == job_id).with_for_update()
+    ).scalar_one()
+    return latest == attempt
+
+
+def _progress(job):
+    """
+    A progress callback for the ingest functions that adds to the job's
+    processed count and commits it with a fresh heartbeat. A count of 0 only
+    refreshes the heartbeat.
+    """
+    attempt = job.attempts
+    processed = 0
+
+    def advance(count):
+        nonlocal processed
+        processed += count
+        _write_progress(job.id, attempt, processed)
+
+    return advance
+
+
+def _write_progress(job_id, attempt, processed):
+    # SQLite allows one writer at a time, so a second connection would wait
+    # on the job's own transaction; there progress is only seen at the end
+    if db.engine.dialect.name == "sqlite":
+        return
+    # once the job has been claimed again the newer attempt reports for it
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.attempts == attempt)
+            .values(processed=processed, heartbeat=utc_now())
+        )
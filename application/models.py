@@ -2,16 +2,31 @@ import datetime
 import uuid
 from enum import Enum, auto
 from functools import total_ordering
+from itertools import chain
 from typing import List, Optional
 
 from flask import url_for
-from sqlalchemy import JSON, UUID, ForeignKey, Text, event
+from sqlalchemy import DDL, JSON, UUID, FetchedValue, ForeignKey, Text, event, text
 from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.ext.mutable import MutableDict
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
 from application.extensions import db
-from application.utils import collect_start_date, date_to_string, parse_date
+from application.utils import (
+    as_utc,
+    collect_start_date,
+    date_to_string,
+    parse_date,
+    utc_now,
+)
+
+# display order: these fields first, then other fields alphabetically, then
+# datetime fields with entry, start and end dates in that order
+LEADING_FIELDS = ["entity", "name", "prefix", "reference"]
+DATETIME_FIELD_RANKS = {"entry": 0, "start": 1, "end": 3}
+
+# name-like keys of Record.data that are included in full-text search
+SEARCH_DATA_KEYS = ["name", "title"]
 
 dataset_field = db.Table(
     "dataset_field",
@@ -38,6 +53,12 @@ class ChangeType(Enum):
 
 class ChangeLog(db.Model):
     __tablename__ = "change_log"
+    __table_args__ = (
+        db.Index("ix_change_log_dataset_id_created_date", "dataset_id", "created_date"),
+        db.Index("ix_change_log_record_id", "record_id"),
+        db.Index("ix_change_log_txid_id", "txid", "id"),
+        db.Index("ix_change_log_dataset_id_txid_id", "dataset_id", "txid", "id"),
+    )
 
     id: Mapped[uuid.uuid4] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -50,6 +71,11 @@ class ChangeLog(db.Model):
     created_date: Mapped[datetime.date] = mapped_column(
         db.Date, default=datetime.datetime.today
     )
+    # set by the database to the inserting transaction's id, so that with id
+    # it orders the change feed by commit (see main.changes_json)
+    txid: Mapped[Optional[int]] = mapped_column(
+        db.BigInteger, server_default=FetchedValue()
+    )
     data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     github_login: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -109,21 +135,60 @@ class Dataset(DateModel):
         "Reference", back_populates="dataset", cascade="all, delete"
     )
 
+    # incremented whenever the dataset, its fields, records or change log
+    # change - used to build ETags for the exports
+    version: Mapped[int] = mapped_column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    modified: Mapped[Optional[datetime.datetime]] = mapped_column(
+        db.DateTime(timezone=True), default=utc_now
+    )
+
     def sorted_fields(self):
-        return sorted(self.fields)
+        """
+        Fields in display order. The ordering is cached on the instance and
+        keyed on the dataset's fields, so it is rebuilt whenever a field is
+        added to or removed from dataset_field.
+        """
+        key = tuple((field.field, field.datatype) for field in self.fields)
+        cached = getattr(self, "_sorted_fields_cache", None)
+        if cached is None or cached[0] != key:
+            cached = (key, sorted(self.fields, key=Field.sort_key))
+            self._sorted_fields_cache = cached
+        return list(cached[1])
 
     def __repr__(self):
         return (
             f"<Dataset(dataset={self.dataset}, name={self.name}, fields={self.fields})>"
         )
 
-    def to_dict(self):
+    @property
+    def etag(self):
+        return f"{self.dataset}-{self.version}"
+
+    @property
+    def last_modified(self):
+        return as_utc(self.modified)
+
+    def record_count(self):
+        return (
+            db.session.query(db.func.count(Record.id))
+            .filter(Record.dataset_id == self.dataset)
+            .scalar()
+        )
+
+    def to_dict(self, total_records=None):
+        if total_records is None:
+            total_records = self.record_count()
         return {
             "dataset": self.dataset,
             "name": self.name,
-            "total_records": len(self.records),
+            "total_records": total_records,
             "last_updated": self.last_updated,
-            "data": f"{url_for('main.dataset_json', id=self.dataset, _external=True)}",
+            # every record, as the link served before dataset.json was paginated
+            "data": url_for(
+                "main.dataset_json", id=self.dataset, all="true", _external=True
+            ),
         }
 
 
@@ -156,8 +221,37 @@ class Reference(db.Model):
         return hash((self.referenced_by, self.specification))
 
 
+def record_search_document(prefix=""):
+    """
+    SQL for the Postgres tsvector of a record that search matches against.
+    The ix_record_search index is built on this expression without a prefix;
+    queries may qualify the columns with one, e.g. "record.".
+    """
+    parts = [
+        f"coalesce({prefix}{column}, '')"
+        for column in ["reference", "description", "notes"]
+    ] + [f"coalesce({prefix}data ->> '{key}', '')" for key in SEARCH_DATA_KEYS]
+    document = " || ' ' || ".join(parts)
+    return f"to_tsvector('english', {document})"
+
+
 class Record(DateModel):
     __tablename__ = "record"
+    __table_args__ = (
+        db.Index(
+            "ix_record_dataset_id_entity_active",
+            "dataset_id",
+            "entity",
+            postgresql_where=text("end_date IS NULL"),
+            sqlite_where=text("end_date IS NULL"),
+        ),
+        db.Index("ix_record_dataset_id_row_id", "dataset_id", "row_id"),
+        db.Index(
+            "ix_record_search",
+            text(record_search_document()),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id: Mapped[uuid.uuid4] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -275,46 +369,16 @@ class Field(DateModel):
     def __eq__(self, other):
         return self.field == other.field
 
-    def __lt__(self, other):
-        if self.field == "entity":
-            return True
-        if self.field == "name" and other.field != "entity":
-            return True
-        if self.field == "prefix" and other.field not in ["entity", "name"]:
-            return True
-        if self.field == "reference" and other.field not in [
-            "entity",
-            "name",
-            "prefix",
-        ]:
-            return True
-
-        if self.field not in [
-            "entity",
-            "name",
-            "prefix",
-            "reference",
-        ] and other.field not in ["entity", "name", "prefix", "reference"]:
-            if self.datatype == "datetime" and other.datatype != "datetime":
-                return False
-
-            if self.datatype == "datetime" and other.datatype == "datetime":
-                prefix = self.field.split("-")[0]
-                other_prefix = other.field.split("-")[0]
-                if prefix == "entry" and other_prefix != "entry":
-                    return True
-                if prefix == "start" and other_prefix != "entry":
-                    return True
-                if prefix == "end" and other_prefix not in ["entry", "start"]:
-                    return False
-
-            if self.datatype != "datetime" and other.datatype != "datetime":
-                return self.field < other.field
-
-            if self.datatype != "datetime" and other.datatype == "datetime":
-                return True
+    def sort_key(self):
+        if self.field in LEADING_FIELDS:
+            return (0, LEADING_FIELDS.index(self.field), "")
+        if self.datatype == "datetime":
+            prefix = self.field.split("-")[0]
+            return (2, DATETIME_FIELD_RANKS.get(prefix, 2), self.field)
+        return (1, 0, self.field)
 
-        return False
+    def __lt__(self, other):
+        return self.sort_key() < other.sort_key()
 
 
 class UpdateStatus(Enum):
@@ -345,6 +409,7 @@ class Update(db.Model):
 
 class UpdateRecord(db.Model):
     __tablename__ = "update_record"
+    __table_args__ = (db.Index("ix_update_record_update_id", "update_id"),)
 
     id: Mapped[uuid.uuid4] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -358,6 +423,146 @@ class UpdateRecord(db.Model):
     new_record: Mapped[bool] = mapped_column(db.Boolean, default=False, nullable=False)
 
 
+class JobType(Enum):
+    UPLOAD = "UPLOAD"
+    UPDATE = "UPDATE"
+    APPLY_UPDATES = "APPLY_UPDATES"
+
+
+class JobStatus(Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETE = "COMPLETE"
+    FAILED = "FAILED"
+
+
+class Job(db.Model):
+    __tablename__ = "job"
+    __table_args__ = (db.Index("ix_job_status_created", "status", "created"),)
+
+    id: Mapped[uuid.uuid4] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    dataset_id: Mapped[str] = mapped_column(Text, ForeignKey("dataset.dataset"))
+    dataset: Mapped[Dataset] = relationship("Dataset")
+    job_type: Mapped[JobType] = mapped_column(ENUM(JobType), nullable=False)
+    status: Mapped[JobStatus] = mapped_column(
+        ENUM(JobStatus), nullable=False, default=JobStatus.PENDING
+    )
+    # staged input, e.g. the rows of an uploaded csv file
+    data: Mapped[dict] = mapped_column(JSON, nullable=False)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    total: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    processed: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    # times a worker has started the job (see application.jobs.claim_next)
+    attempts: Mapped[int] = mapped_column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    github_login: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created: Mapped[datetime.datetime] = mapped_column(
+        db.DateTime(timezone=True), default=utc_now
+    )
+    started: Mapped[Optional[datetime.datetime]] = mapped_column(
+        db.DateTime(timezone=True)
+    )
+    finished: Mapped[Optional[datetime.datetime]] = mapped_column(
+        db.DateTime(timezone=True)
+    )
+    # last progress from the worker running the job
+    heartbeat: Mapped[Optional[datetime.datetime]] = mapped_column(
+        db.DateTime(timezone=True)
+    )
+
+    @property
+    def done(self):
+        return self.status in (JobStatus.COMPLETE, JobStatus.FAILED)
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "dataset": self.dataset_id,
+            "type": self.job_type.value,
+            "status": self.status.value,
+            "total": self.total,
+            "processed": self.processed,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created.isoformat() if self.created else None,
+            "started": self.started.isoformat() if self.started else None,
+            "finished": self.finished.isoformat() if self.finished else None,
+        }
+
+    def __repr__(self):
+        return f"<Job(dataset={self.dataset_id}, type={self.job_type}, status={self.status})>"
+
+
+class EntitySequence(db.Model):
+    """
+    The next unallocated entity and row_id for a dataset. Both are handed out
+    by application.entities, which moves them on under a row lock. A null
+    next_row_id is worked out from the dataset's records when first needed.
+    """
+
+    __tablename__ = "entity_sequence"
+
+    dataset_id: Mapped[str] = mapped_column(
+        Text, ForeignKey("dataset.dataset"), primary_key=True
+    )
+    next_entity: Mapped[int] = mapped_column(db.BigInteger, nullable=False)
+    next_row_id: Mapped[Optional[int]] = mapped_column(db.Integer)
+
+    def __repr__(self):
+        return f"<EntitySequence(dataset={self.dataset_id}, next_entity={self.next_entity})>"
+
+
+class PlatformStatus(db.Model):
+    """
+    Whether a dataset was found on the platform when last checked. Kept out
+    of Dataset so that refreshing it doesn't change the dataset's version.
+    """
+
+    __tablename__ = "platform_status"
+
+    dataset_id: Mapped[str] = mapped_column(
+        Text, ForeignKey("dataset.dataset"), primary_key=True
+    )
+    available: Mapped[bool] = mapped_column(db.Boolean, nullable=False)
+    checked: Mapped[datetime.datetime] = mapped_column(
+        db.DateTime(timezone=True), nullable=False, default=utc_now
+    )
+
+    def __repr__(self):
+        return (
+            f"<PlatformStatus(dataset={self.dataset_id}, available={self.available})>"
+        )
+
+
+class RegisterExport(db.Model):
+    """
+    The dataset version and SHA-256 of the register last exported for a
+    dataset, and the SHA-256 last pushed to the datasets repo. Kept in the
+    database rather than next to the files because the commands run on
+    one-off dynos whose filesystem doesn't outlive them.
+    """
+
+    __tablename__ = "register_export"
+
+    dataset_id: Mapped[str] = mapped_column(
+        Text, ForeignKey("dataset.dataset"), primary_key=True
+    )
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    sha256: Mapped[str] = mapped_column(Text, nullable=False)
+    pushed_sha256: Mapped[Optional[str]] = mapped_column(Text)
+    exported: Mapped[datetime.datetime] = mapped_column(
+        db.DateTime(timezone=True), nullable=False, default=utc_now
+    )
+
+    def __repr__(self):
+        return f"<RegisterExport(dataset={self.dataset_id}, version={self.version})>"
+
+
 def create_change_log(record, data, change_type, github_login=None):
     previous = record.to_dict()
     reference = previous["reference"]
@@ -454,6 +659,83 @@ def receive_append(target, value, initiator):
     target.last_updated = datetime.date.today()
 
 
+@event.listens_for(Session, "before_flush")
+def receive_before_flush(session, flush_context, instances):
+    dataset_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Dataset):
+            dataset_ids.add(obj.dataset)
+        elif isinstance(obj, (Record, ChangeLog)):
+            if obj.dataset_id is not None:
+                dataset_ids.add(obj.dataset_id)
+            elif obj.dataset is not None:
+                dataset_ids.add(obj.dataset.dataset)
+        elif isinstance(obj, Field):
+            # a field's name, description and datatype are in every dataset
+            # that uses it
+            dataset_ids.update(dataset.dataset for dataset in obj.datasets)
+
+    for dataset_id in dataset_ids:
+        dataset = session.get(Dataset, dataset_id)
+        if dataset is None or dataset in session.new:
+            continue
+        dataset.version = Dataset.version + 1
+        dataset.modified = utc_now()
+
+
+# Postgres stamps each change with its transaction's id. SQLite has a single
+# writer, so there the rowid already follows commit order.
+event.listen(
+    ChangeLog.__table__,
+    "after_create",
+    DDL(
+        "ALTER TABLE change_log ALTER COLUMN txid "
+        "SET DEFAULT pg_current_xact_id()::text::bigint"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    ChangeLog.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER change_log_txid AFTER INSERT ON change_log "
+        "WHEN new.txid IS NULL "
+        "BEGIN UPDATE change_log SET txid = new.rowid WHERE rowid = new.rowid; END"
+    ).execute_if(dialect="sqlite"),
+)
+
+
+# SQLite has no tsvector, so locally and in tests records are searched through
+# an FTS5 table that triggers keep in step with record
+_sqlite_search_document = " || ' ' || ".join(
+    [f"coalesce(new.{column}, '')" for column in ["reference", "description", "notes"]]
+    + [f"coalesce(json_extract(new.data, '$.{key}'), '')" for key in SEARCH_DATA_KEYS]
+)
+_sqlite_search_insert = (
+    "INSERT INTO record_search (document, record_id, dataset_id) "
+    f"VALUES ({_sqlite_search_document}, new.id, new.dataset_id);"
+)
+for _statement in [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS record_search USING fts5("
+    "document, record_id UNINDEXED, dataset_id UNINDEXED, "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER record_search_insert AFTER INSERT ON record "
+    f"BEGIN {_sqlite_search_insert} END",
+    "CREATE TRIGGER record_search_update AFTER UPDATE ON record "
+    "BEGIN DELETE FROM record_search WHERE record_id = old.id; "
+    f"{_sqlite_search_insert} END",
+    "CREATE TRIGGER record_search_delete AFTER DELETE ON record "
+    "BEGIN DELETE FROM record_search WHERE record_id = old.id; END",
+]:
+    event.listen(
+        Record.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Record.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS record_search").execute_if(dialect="sqlite"),
+)
+
+
 @event.listens_for(Record, "before_insert")
 def receive_before_insert(mapper, connection, target):
     start_date = target.data.get("start-date", None)
@@ -0,0 +1,92 @@
+"""
+Whether each dataset is published on the planning data platform.
+
+The Links tab only reads the stored PlatformStatus. A missing or stale status
+is refreshed on a background thread (when PLATFORM_CHECK_IN_BACKGROUND is
+set) or by `flask data check-platform`, so page views never wait on the
+platform.
+"""
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from application.extensions import db
+from application.http_client import get_session
+from application.models import PlatformStatus
+from application.utils import as_utc, utc_now
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="platform-check")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def platform_dataset_url(dataset_id):
+    return f"{current_app.config['PLATFORM_URL']}/dataset/{dataset_id}"
+
+
+def check_platform(dataset_id):
+    """
+    HEAD the dataset's platform page. Returns False on any error or timeout.
+    """
+    url = platform_dataset_url(dataset_id)
+    timeout = current_app.config["PLATFORM_CHECK_TIMEOUT"]
+    try:
+        resp = get_session().head(url, timeout=timeout, allow_redirects=True)
+        if resp.status_code == 405:
+            resp = get_session().get(url, timeout=timeout, stream=True)
+            resp.close()
+        resp.raise_for_status()
+    except Exception:
+        return False
+    return True
+
+
+def refresh_platform_status(dataset_id):
+    available = check_platform(dataset_id)
+    status = db.session.get(PlatformStatus, dataset_id)
+    if status is None:
+        status = PlatformStatus(dataset_id=dataset_id)
+        db.session.add(status)
+    status.available = available
+    status.checked = utc_now()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # inserted by a concurrent refresh
+        db.session.rollback()
+    return available
+
+
+def platform_status(dataset_id):
+    """
+    The stored status, which may be None or stale. Missing or stale statuses
+    are queued for a background refresh without waiting for it.
+    """
+    status = db.session.get(PlatformStatus, dataset_id)
+    ttl = datetime.timedelta(seconds=current_app.config["PLATFORM_CHECK_TTL"])
+    if status is None or as_utc(status.checked) + ttl < utc_now():
+        if current_app.config["PLATFORM_CHECK_IN_BACKGROUND"]:
+            _refresh_in_background(dataset_id)
+    return status
+
+
+def _refresh_in_background(dataset_id):
+    with _pending_lock:
+        if dataset_id in _pending:
+            return
+        _pending.add(dataset_id)
+    _executor.submit(_refresh, current_app._get_current_object(), dataset_id)
+
+
+def _refresh(app, dataset_id):
+    try:
+        with app.app_context():
+            refresh_platform_status(dataset_id)
+    except Exception:
+        app.logger.exception(f"platform check for {dataset_id} failed")
+    finally:
+        with _pending_lock:
+            _pending.discard(dataset_id)
@@ -0,0 +1,92 @@
+"""
+EXPLAIN the hot record, change log and update queries made by the main and
+upload views, and report any that fall back to a sequential scan.
+
+On Postgres sequential scans are disabled while explaining, as the planner
+prefers them for small tables, so a remaining Seq Scan means no usable index.
+"""
+
+import uuid
+
+from sqlalchemy import desc, func, select, text
+
+from application.extensions import db
+from application.models import ChangeLog, Record, UpdateRecord
+
+CHECKED_TABLES = ("record", "change_log", "update_record")
+
+
+def key_queries(dataset_id="example-dataset", record_id=None, update_id=None):
+    record_id = record_id or uuid.uuid4()
+    update_id = update_id or uuid.uuid4()
+    return {
+        "records page": select(Record)
+        .where(Record.dataset_id == dataset_id, Record.row_id > 100)
+        .order_by(Record.row_id)
+        .limit(100),
+        "record count": select(func.count(Record.id)).where(
+            Record.dataset_id == dataset_id
+        ),
+        "next row_id": select(func.max(Record.row_id)).where(
+            Record.dataset_id == dataset_id
+        ),
+        "active records by entity": select(Record).where(
+            Record.dataset_id == dataset_id,
+            Record.entity.in_([1, 2, 3]),
+            Record.end_date.is_(None),
+        ),
+        "change log by dataset": select(ChangeLog)
+        .where(ChangeLog.dataset_id == dataset_id)
+        .order_by(desc(ChangeLog.created_date)),
+        "change log by record": select(ChangeLog).where(
+            ChangeLog.record_id == record_id
+        ),
+        "update records": select(UpdateRecord).where(
+            UpdateRecord.update_id == update_id
+        ),
+    }
+
+
+def explain(statement):
+    """
+    Return the query plan of statement as a list of lines.
+    """
+    dialect = db.session.get_bind().dialect
+    sql = str(
+        statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    )
+    if dialect.name == "postgresql":
+        db.session.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = db.session.execute(text(f"EXPLAIN {sql}")).all()
+        return [row[0] for row in rows]
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return [row[-1] for row in rows]
+
+
+def sequential_scans(plan):
+    """
+    Tables in CHECKED_TABLES read by a full scan in the plan.
+    """
+    scanned = set()
+    for line in plan:
+        line = line.strip().lstrip("->").strip()
+        for table in CHECKED_TABLES:
+            if line.startswith(f"Seq Scan on {table} ") or line.startswith(
+                f"SCAN {table}"
+            ):
+                scanned.add(table)
+    return scanned
+
+
+def check_query_plans(**kwargs):
+    """
+    EXPLAIN each key query. Returns {name: (plan, sequentially scanned tables)}.
+    """
+    results = {}
+    try:
+        for name, statement in key_queries(**kwargs).items():
+            plan = explain(statement)
+            results[name] = (plan, sequential_scans(plan))
+    finally:
+        db.session.rollback()
+    return results
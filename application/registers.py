@@ -0,0 +1,244 @@
+"""
+Export of each active dataset's records to a register CSV in data/registers,
+for `flask data backup-registers`, and the push of those registers to the
+datasets repo for `flask data push-registers`.
+
+A RegisterExport row records the dataset version and SHA-256 of each
+exported file. A register is only exported again when its dataset's version
+has moved on or the file is missing or no longer matches. Exports run on a
+thread pool, stream records with yield_per and are written to a temporary
+file that is renamed into place, so a failed export never leaves a truncated
+register.
+
+The row also records the SHA-256 last pushed for each register, so a push
+only sends files that have changed since, even when they were exported again
+on a fresh dyno. Changed registers are pushed in a single commit built with
+the Git data API.
+"""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from flask import current_app
+from github import InputGitTreeElement
+
+from application.extensions import db
+from application.models import Dataset, Record, RegisterExport
+from application.utils import utc_now
+
+REGISTERS_DIR = Path(__file__).resolve().parent.parent / "data/registers"
+EXPORT_CHUNK_SIZE = 1000
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def export_registers(directory=REGISTERS_DIR, workers=4, force=False):
+    """
+    Export changed registers. Returns (dataset, status, detail) for every
+    active dataset with records, where status is exported, unchanged or
+    failed.
+    """
+    directory = Path(directory)
+    exported = {export.dataset_id: export for export in RegisterExport.query}
+    has_records = (
+        db.session.query(Record.dataset_id)
+        .filter(Record.dataset_id == Dataset.dataset)
+        .exists()
+    )
+    datasets = (
+        Dataset.query.filter(Dataset.end_date.is_(None))
+        .filter(has_records)
+        .order_by(Dataset.dataset)
+        .all()
+    )
+
+    results = []
+    exports = []
+    for dataset in datasets:
+        file_path = directory / f"{dataset.dataset}.csv"
+        export = exported.get(dataset.dataset)
+        if (
+            not force
+            and export is not None
+            and export.version == dataset.version
+            and file_path.exists()
+            and file_sha256(file_path) == export.sha256
+        ):
+            results.append((dataset.dataset, "unchanged", file_path))
+            continue
+        fieldnames = [field.field for field in dataset.sorted_fields()]
+        exports.append((dataset, fieldnames, file_path))
+
+    app = current_app._get_current_object()
+
+    def export(item):
+        dataset_id, fieldnames, file_path = item
+        with app.app_context():
+            return export_register(dataset_id, fieldnames, file_path)
+
+    items = [
+        (dataset.dataset, fieldnames, path) for dataset, fieldnames, path in exports
+    ]
+    if workers > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(export, item): item for item in items}
+            outcomes = {}
+            for future in as_completed(futures):
+                outcomes[futures[future][0]] = _outcome(future.result)
+    else:
+        outcomes = {item[0]: _outcome(lambda: export_register(*item)) for item in items}
+
+    for dataset, _, file_path in exports:
+        sha256, error = outcomes[dataset.dataset]
+        if error is not None:
+            results.append((dataset.dataset, "failed", error))
+            continue
+        export = exported.get(dataset.dataset)
+        if export is None:
+            export = RegisterExport(dataset_id=dataset.dataset)
+            db.session.add(export)
+        export.version = dataset.version
+        export.sha256 = sha256
+        export.exported = utc_now()
+        results.append((dataset.dataset, "exported", file_path))
+
+    db.session.commit()
+    return sorted(results)
+
+
+def export_register(dataset_id, fieldnames, file_path):
+    """
+    Write the dataset's records to file_path and return the file's SHA-256.
+    """
+    return _atomic_write(file_path, csv_chunks(dataset_id, fieldnames))
+
+
+def csv_chunks(dataset_id, fieldnames, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    A dataset's records as CSV in row order, in chunks of chunk_size rows
+    after the header. Records are streamed with yield_per, so the whole
+    dataset is never held in memory. Also used to serve /dataset/<id>.csv.
+    """
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames)
+
+    def flush():
+        chunk = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return chunk
+
+    writer.writeheader()
+    yield flush()
+
+    records = (
+        Record.query.filter(Record.dataset_id == dataset_id)
+        .order_by(Record.row_id)
+        .yield_per(chunk_size)
+    )
+    for count, record in enumerate(records, start=1):
+        writer.writerow(record.to_dict())
+        if count % chunk_size == 0:
+            yield flush()
+
+    chunk = flush()
+    if chunk:
+        yield chunk
+
+
+def _atomic_write(path, chunks):
+    path = Path(path)
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        # the file's bytes must be exactly the bytes hashed
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                sha256.update(chunk.encode("utf-8"))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return sha256.hexdigest()
+
+
+def push_changed_registers(
+    repo,
+    registers_path,
+    directory=REGISTERS_DIR,
+    branch=None,
+    message="Updated dataset registers",
+):
+    """
+    Push registers that have changed since the last push to registers_path in
+    repo as one commit. repo is a PyGithub Repository or anything with the
+    same Git data methods. Returns the paths committed and the commit, which
+    is None when nothing needed pushing.
+    """
+    directory = Path(directory)
+    changed = []
+    for export in RegisterExport.query.order_by(RegisterExport.dataset_id):
+        file_path = directory / f"{export.dataset_id}.csv"
+        if not file_path.exists():
+            continue
+        sha256 = file_sha256(file_path)
+        if export.pushed_sha256 != sha256:
+            changed.append((export, file_path, sha256))
+    if not changed:
+        return [], None
+
+    ref = repo.get_git_ref(f"heads/{branch or repo.default_branch}")
+    parent = repo.get_git_commit(ref.object.sha)
+    remote = {
+        element.path: element.sha
+        for element in repo.get_git_tree(parent.tree.sha, recursive=True).tree
+        if element.type == "blob"
+    }
+
+    elements = []
+    pushed = []
+    for export, file_path, sha256 in changed:
+        content = file_path.read_bytes()
+        remote_path = f"{registers_path}/{file_path.name}"
+        if remote.get(remote_path) != git_blob_sha(content):
+            elements.append(
+                InputGitTreeElement(
+                    remote_path, "100644", "blob", content=content.decode("utf-8")
+                )
+            )
+            pushed.append(remote_path)
+        export.pushed_sha256 = sha256
+
+    commit = None
+    if elements:
+        tree = repo.create_git_tree(elements, parent.tree)
+        commit = repo.create_git_commit(message, tree, [parent])
+        ref.edit(commit.sha)
+    db.session.commit()
+    return pushed, commit
+
+
+def git_blob_sha(content):
+    """
+    The SHA-1 git gives a blob of content, as listed in a tree.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def _outcome(func):
+    try:
+        return func(), None
+    except Exception as e:
+        return None, e
@@ -0,0 +1,57 @@
+"""
+Full-text search over records' reference, description, notes and name-like
+data keys (see SEARCH_DATA_KEYS).
+
+On Postgres records are matched against the tsvector expression behind the
+ix_record_search GIN index and ranked with ts_rank. On SQLite, used locally
+and in tests, they are matched against the record_search FTS5 table and
+ranked with bm25.
+"""
+import re
+
+from sqlalchemy import column, func, literal_column, table
+
+from application.extensions import db
+from application.models import Dataset, Record, record_search_document
+
+record_search = table("record_search", column("record_id"), column("dataset_id"))
+
+
+def search_terms(q):
+    return re.findall(r"\w+", q or "")
+
+
+def search_records(q, dataset_id=None, limit=100, offset=0):
+    """
+    Records in active datasets matching all the words in q, best match first,
+    as (record, rank) pairs where a higher rank is a better match.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    if db.session.get_bind().dialect.name == "postgresql":
+        document = literal_column(record_search_document("record."))
+        tsquery = func.websearch_to_tsquery("english", q)
+        rank = func.ts_rank(document, tsquery)
+        query = db.session.query(Record, rank.label("rank")).filter(
+            document.op("@@")(tsquery)
+        )
+    else:
+        match = " ".join(f'"{term}"' for term in terms)
+        rank = -func.bm25(literal_column("record_search"))
+        query = (
+            db.session.query(Record, rank.label("rank"))
+            .join(record_search, record_search.c.record_id == Record.id)
+            .filter(literal_column("record_search").op("MATCH")(match))
+        )
+    query = query.join(Dataset, Dataset.dataset == Record.dataset_id).filter(
+        Dataset.end_date.is_(None)
+    )
+    if dataset_id is not None:
+        query = query.filter(Record.dataset_id == dataset_id)
+    return (
+        query.order_by(rank.desc(), Record.dataset_id, Record.row_id)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
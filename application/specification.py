@@ -0,0 +1,86 @@
+"""
+Specification markdown for each dataset, as used by the `flask data` sync
+commands.
+
+With SPECIFICATION_PATH set the markdown is read from that local checkout of
+the specification repo. Otherwise it is fetched from GitHub and kept in
+SPECIFICATION_CACHE_DIR along with its parsed front matter. Cached entries
+younger than SPECIFICATION_CACHE_MAX_AGE seconds are used without a request;
+older ones are revalidated with If-None-Match.
+"""
+import hashlib
+import json
+import os
+import time
+
+import frontmatter
+
+base_git_content_url = "https://raw.githubusercontent.com/digital-land"
+specfication_markdown_url = (
+    "{base_git_content_url}/specification/main/content/dataset/{dataset}.md"
+)
+
+
+def get_specification(client, dataset_id, config):
+    """
+    The source of the dataset's specification (a url or path) and its front
+    matter, or None as the front matter if the dataset has no markdown.
+    Safe to call from HttpClient.map.
+    """
+    if config.get("SPECIFICATION_PATH"):
+        path = os.path.join(
+            config["SPECIFICATION_PATH"], "content", "dataset", f"{dataset_id}.md"
+        )
+        if not os.path.exists(path):
+            return path, None
+        with open(path) as f:
+            return path, frontmatter.loads(f.read()).metadata
+
+    url = specfication_markdown_url.format(
+        base_git_content_url=base_git_content_url, dataset=dataset_id
+    )
+    cache_path = os.path.join(config["SPECIFICATION_CACHE_DIR"], f"{dataset_id}.json")
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        age = time.time() - os.path.getmtime(cache_path)
+        if age < config["SPECIFICATION_CACHE_MAX_AGE"]:
+            return url, cached["front"]
+
+    headers = {}
+    if cached is not None and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    resp = client.get(url, headers=headers)
+    if resp.status_code == 304 and cached is not None:
+        os.utime(cache_path)
+        return url, cached["front"]
+    if resp.status_code != 200:
+        return url, None
+
+    front = frontmatter.loads(resp.text).metadata
+    _write_cache(
+        cache_path,
+        {
+            "etag": resp.headers.get("ETag"),
+            "sha256": hashlib.sha256(resp.content).hexdigest(),
+            "markdown": resp.text,
+            "front": front,
+        },
+    )
+    # return the front matter as it will be read back from the cache
+    return url, json.loads(json.dumps(front, default=str))
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path, entry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f, default=str)
+    os.replace(tmp_path, path)
@@ -41,6 +41,17 @@ def parse_date(date_string):
         return None
 
 
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def as_utc(value):
+    # sqlite drops the timezone from DateTime(timezone=True) columns
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
 def date_to_string(date):
     try:
         return date.strftime("%Y-%m-%d")
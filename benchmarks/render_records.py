@@ -0,0 +1,142 @@
+"""
+Benchmark the field ordering done when rendering the records table, comparing
+the old per-row comparator sort with the cached field ordering.
+
+    python benchmarks/render_records.py [rows]
+
+The baseline reproduces the previous behaviour: a fresh sort through the
+Field comparator for the header and again for every row.
+"""
+import sys
+import timeit
+from functools import cmp_to_key
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import render_template  # noqa: E402
+
+from application.extensions import db  # noqa: E402
+from application.factory import create_app  # noqa: E402
+from application.models import Dataset, Field, Record  # noqa: E402
+
+FIELDS = {
+    "entity": "integer",
+    "name": "string",
+    "prefix": "string",
+    "reference": "string",
+    "description": "text",
+    "notes": "text",
+    "organisation": "curie",
+    "documentation-url": "url",
+    "category": "curie",
+    "project": "string",
+    "specification": "string",
+    "provision-reason": "string",
+    "entry-date": "datetime",
+    "start-date": "datetime",
+    "end-date": "datetime",
+}
+
+
+def legacy_lt(self, other):
+    if self.field == "entity":
+        return True
+    if self.field == "name" and other.field != "entity":
+        return True
+    if self.field == "prefix" and other.field not in ["entity", "name"]:
+        return True
+    if self.field == "reference" and other.field not in ["entity", "name", "prefix"]:
+        return True
+    leading = ["entity", "name", "prefix", "reference"]
+    if self.field not in leading and other.field not in leading:
+        if self.datatype == "datetime" and other.datatype != "datetime":
+            return False
+        if self.datatype == "datetime" and other.datatype == "datetime":
+            prefix = self.field.split("-")[0]
+            other_prefix = other.field.split("-")[0]
+            if prefix == "entry" and other_prefix != "entry":
+                return True
+            if prefix == "start" and other_prefix != "entry":
+                return True
+            if prefix == "end" and other_prefix not in ["entry", "start"]:
+                return False
+        if self.datatype != "datetime" and other.datatype != "datetime":
+            return self.field < other.field
+        if self.datatype != "datetime" and other.datatype == "datetime":
+            return True
+    return False
+
+
+def legacy_sorted_fields(dataset):
+    def compare(a, b):
+        if legacy_lt(a, b):
+            return -1
+        if legacy_lt(b, a):
+            return 1
+        return 0
+
+    return sorted(dataset.fields, key=cmp_to_key(compare))
+
+
+def seed(rows):
+    dataset = Dataset(dataset="benchmark", name="Benchmark", entity_minimum=1)
+    for field, datatype in FIELDS.items():
+        dataset.fields.append(Field(field=field, name=field, datatype=datatype))
+    for row_id in range(rows):
+        dataset.records.append(
+            Record(
+                row_id=row_id,
+                entity=row_id + 1,
+                prefix="benchmark",
+                reference=f"ref-{row_id}",
+                data={"name": f"Record {row_id}", "project": "project"},
+            )
+        )
+    db.session.add(dataset)
+    db.session.commit()
+    return dataset
+
+
+def order_for_table(dataset, records, sorted_fields):
+    # one ordering for the header and one for every row
+    for _ in range(len(records) + 1):
+        sorted_fields(dataset)
+
+
+def best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(rows=500, repeat=5):
+    app = create_app("application.config.TestConfig")
+    with app.test_request_context():
+        db.create_all()
+        dataset = seed(rows)
+        records = list(dataset.records)
+
+        legacy = best(
+            lambda: order_for_table(dataset, records, legacy_sorted_fields), repeat
+        )
+        cached = best(
+            lambda: order_for_table(dataset, records, Dataset.sorted_fields), repeat
+        )
+        page = best(
+            lambda: render_template(
+                "records.html",
+                dataset=dataset,
+                records=records,
+                page={},
+                sub_navigation={},
+            ),
+            repeat,
+        )
+
+    print(f"{rows} rows, {len(FIELDS)} fields (best of {repeat})")
+    print(f"  field ordering, comparator sort per row: {legacy * 1000:8.2f} ms")
+    print(f"  field ordering, cached:                  {cached * 1000:8.2f} ms")
+    print(f"  records.html render:                     {page * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
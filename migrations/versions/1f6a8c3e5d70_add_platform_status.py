@@ -0,0 +1,30 @@
+"""add platform_status table
+
+Revision ID: 1f6a8c3e5d70
+Revises: e5b1c7f3a9d2
+Create Date: 2026-10-17 17:30:51.774019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f6a8c3e5d70'
+down_revision = 'e5b1c7f3a9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('platform_status',
+    sa.Column('dataset_id', sa.Text(), nullable=False),
+    sa.Column('available', sa.Boolean(), nullable=False),
+    sa.Column('checked', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['dataset_id'], ['dataset.dataset'], ),
+    sa.PrimaryKeyConstraint('dataset_id')
+    )
+
+
+def downgrade():
+    op.drop_table('platform_status')
@@ -0,0 +1,28 @@
+"""add version and modified to dataset
+
+Revision ID: 4b7e2a91c3d5
+Revises: 265314c786fe
+Create Date: 2026-10-17 09:12:31.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2a91c3d5'
+down_revision = '265314c786fe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('dataset', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('modified', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('dataset', schema=None) as batch_op:
+        batch_op.drop_column('modified')
+        batch_op.drop_column('version')
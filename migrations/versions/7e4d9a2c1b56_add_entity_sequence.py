@@ -0,0 +1,40 @@
+"""add entity_sequence table for allocating entities
+
+Revision ID: 7e4d9a2c1b56
+Revises: c3a8d61f0e27
+Create Date: 2026-10-17 15:21:43.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e4d9a2c1b56'
+down_revision = 'c3a8d61f0e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('entity_sequence',
+    sa.Column('dataset_id', sa.Text(), nullable=False),
+    sa.Column('next_entity', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['dataset_id'], ['dataset.dataset'], ),
+    sa.PrimaryKeyConstraint('dataset_id')
+    )
+    # start each dataset's sequence after its highest existing entity
+    op.execute(
+        """
+        INSERT INTO entity_sequence (dataset_id, next_entity)
+        SELECT dataset.dataset,
+               GREATEST(COALESCE(MAX(record.entity) + 1, 1), COALESCE(dataset.entity_minimum, 1))
+        FROM dataset
+        LEFT JOIN record ON record.dataset_id = dataset.dataset
+        GROUP BY dataset.dataset, dataset.entity_minimum
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('entity_sequence')
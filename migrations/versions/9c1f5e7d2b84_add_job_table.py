@@ -0,0 +1,49 @@
+"""add job table for background upload and update processing
+
+Revision ID: 9c1f5e7d2b84
+Revises: 4b7e2a91c3d5
+Create Date: 2026-10-17 11:40:07.215934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '9c1f5e7d2b84'
+down_revision = '4b7e2a91c3d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sa.Enum('UPLOAD', 'UPDATE', 'APPLY_UPDATES', name='jobtype').create(op.get_bind())
+    sa.Enum('PENDING', 'RUNNING', 'COMPLETE', 'FAILED', name='jobstatus').create(op.get_bind())
+    op.create_table('job',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('dataset_id', sa.Text(), nullable=True),
+    sa.Column('job_type', postgresql.ENUM('UPLOAD', 'UPDATE', 'APPLY_UPDATES', name='jobtype', create_type=False), nullable=False),
+    sa.Column('status', postgresql.ENUM('PENDING', 'RUNNING', 'COMPLETE', 'FAILED', name='jobstatus', create_type=False), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('github_login', sa.Text(), nullable=True),
+    sa.Column('created', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('started', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['dataset_id'], ['dataset.dataset'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.create_index('ix_job_status_created', ['status', 'created'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_status_created')
+
+    op.drop_table('job')
+    sa.Enum('PENDING', 'RUNNING', 'COMPLETE', 'FAILED', name='jobstatus').drop(op.get_bind())
+    sa.Enum('UPLOAD', 'UPDATE', 'APPLY_UPDATES', name='jobtype').drop(op.get_bind())
@@ -0,0 +1,34 @@
+"""add full-text search index on record
+
+Revision ID: a3d9e1b7c5f2
+Revises: 1f6a8c3e5d70
+Create Date: 2026-10-17 19:48:12.402761
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d9e1b7c5f2'
+down_revision = '1f6a8c3e5d70'
+branch_labels = None
+depends_on = None
+
+# must match application.models.record_search_document() for searches to use it
+record_search_document = (
+    "to_tsvector('english', coalesce(reference, '') || ' ' || "
+    "coalesce(description, '') || ' ' || coalesce(notes, '') || ' ' || "
+    "coalesce(data ->> 'name', '') || ' ' || coalesce(data ->> 'title', ''))"
+)
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_record_search', 'record', [sa.text(record_search_document)], unique=False, postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_record_search', table_name='record', postgresql_concurrently=True, if_exists=True)
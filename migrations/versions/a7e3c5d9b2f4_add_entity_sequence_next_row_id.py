@@ -0,0 +1,26 @@
+"""add next_row_id to entity_sequence so row_ids are reserved like entities
+
+Revision ID: a7e3c5d9b2f4
+Revises: f4c2b9d7a1e6
+Create Date: 2026-10-17 21:02:37.218904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3c5d9b2f4'
+down_revision = 'f4c2b9d7a1e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('entity_sequence', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_row_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('entity_sequence', schema=None) as batch_op:
+        batch_op.drop_column('next_row_id')
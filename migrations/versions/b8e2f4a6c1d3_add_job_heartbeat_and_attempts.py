@@ -0,0 +1,30 @@
+"""add heartbeat and attempts to job for reclaiming stale jobs
+
+Revision ID: b8e2f4a6c1d3
+Revises: a3d9e1b7c5f2
+Create Date: 2026-10-17 20:12:40.518233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a6c1d3'
+down_revision = 'a3d9e1b7c5f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('heartbeat', sa.DateTime(timezone=True), nullable=True))
+
+    op.execute("UPDATE job SET heartbeat = started, attempts = 1 WHERE started IS NOT NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat')
+        batch_op.drop_column('attempts')
@@ -0,0 +1,35 @@
+"""add indexes for record, change_log and update_record lookups
+
+Revision ID: c3a8d61f0e27
+Revises: 9c1f5e7d2b84
+Create Date: 2026-10-17 14:02:55.630418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8d61f0e27'
+down_revision = '9c1f5e7d2b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_record_dataset_id_entity_active', 'record', ['dataset_id', 'entity'], unique=False, postgresql_where=sa.text('end_date IS NULL'), postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_record_dataset_id_row_id', 'record', ['dataset_id', 'row_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_change_log_dataset_id_created_date', 'change_log', ['dataset_id', 'created_date'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_change_log_record_id', 'change_log', ['record_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_update_record_update_id', 'update_record', ['update_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_update_record_update_id', table_name='update_record', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_change_log_record_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_change_log_dataset_id_created_date', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_record_dataset_id_row_id', table_name='record', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_record_dataset_id_entity_active', table_name='record', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,60 @@
+"""order the change feed by the inserting transaction's id, replacing created
+
+Revision ID: c6d1a8f3e5b9
+Revises: b8e2f4a6c1d3
+Create Date: 2026-10-17 20:31:16.084512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6d1a8f3e5b9'
+down_revision = 'b8e2f4a6c1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('txid', sa.BigInteger(), nullable=True))
+
+    # existing changes are all committed: number them below any transaction id
+    # in their (created, id) order
+    op.execute(
+        "UPDATE change_log SET txid = ranked.n - ranked.total - 1 "
+        "FROM (SELECT id, row_number() OVER (ORDER BY created, id) AS n, "
+        "count(*) OVER () AS total FROM change_log) AS ranked "
+        "WHERE change_log.id = ranked.id"
+    )
+    op.execute("ALTER TABLE change_log ALTER COLUMN txid SET DEFAULT pg_current_xact_id()::text::bigint")
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_change_log_txid_id', 'change_log', ['txid', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_change_log_dataset_id_txid_id', 'change_log', ['dataset_id', 'txid', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_change_log_dataset_id_created_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_change_log_created_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+
+    # created only ordered the feed, and the backfill above was its last use
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_column('created')
+
+
+def downgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created', sa.DateTime(timezone=True), nullable=True))
+
+    # the time of day is lost, so changes sort by date and then id as they did
+    # when created was first added
+    op.execute("UPDATE change_log SET created = CAST(created_date AS timestamp) AT TIME ZONE 'UTC'")
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_change_log_created_id', 'change_log', ['created', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_change_log_dataset_id_created_id', 'change_log', ['dataset_id', 'created', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_change_log_dataset_id_txid_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_change_log_txid_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_column('txid')
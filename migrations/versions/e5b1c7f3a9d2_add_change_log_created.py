@@ -0,0 +1,38 @@
+"""add created timestamp to change_log for the change feed
+
+Revision ID: e5b1c7f3a9d2
+Revises: 7e4d9a2c1b56
+Create Date: 2026-10-17 16:48:12.402871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b1c7f3a9d2'
+down_revision = '7e4d9a2c1b56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created', sa.DateTime(timezone=True), nullable=True))
+
+    # existing changes only have a date, so they sort before later changes by id
+    op.execute("UPDATE change_log SET created = CAST(created_date AS timestamp) AT TIME ZONE 'UTC'")
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_change_log_created_id', 'change_log', ['created', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_change_log_dataset_id_created_id', 'change_log', ['dataset_id', 'created', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_change_log_dataset_id_created_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_change_log_created_id', table_name='change_log', postgresql_concurrently=True, if_exists=True)
+
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_column('created')
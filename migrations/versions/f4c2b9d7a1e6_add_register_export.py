@@ -0,0 +1,32 @@
+"""add register_export table
+
+Revision ID: f4c2b9d7a1e6
+Revises: c6d1a8f3e5b9
+Create Date: 2026-10-17 20:09:12.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c2b9d7a1e6'
+down_revision = 'c6d1a8f3e5b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('register_export',
+    sa.Column('dataset_id', sa.Text(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.Text(), nullable=False),
+    sa.Column('pushed_sha256', sa.Text(), nullable=True),
+    sa.Column('exported', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['dataset_id'], ['dataset.dataset'], ),
+    sa.PrimaryKeyConstraint('dataset_id')
+    )
+
+
+def downgrade():
+    op.drop_table('register_export')
@@ -0,0 +1,111 @@
+"""
+Functional tests for the GitHub login flow, with GitHub stubbed out:
+- org members are logged in
+- membership decisions are cached per login
+- non-members have their grant revoked
+- GitHub errors are neither cached nor treated as non-membership
+"""
+
+from http import HTTPStatus
+
+import pytest
+import requests
+
+from application.blueprints.auth import views
+from application.extensions import oauth
+
+
+class StubGitHub:
+    def __init__(self, members, membership_status=None):
+        self.members = members
+        self.membership_status = membership_status
+        self.calls = []
+
+    def _response(self, status_code, body=b""):
+        resp = requests.Response()
+        resp.status_code = status_code
+        resp._content = body
+        return resp
+
+    def get(self, url, **kwargs):
+        self.calls.append(("GET", url))
+        if url == "https://github.stub/api/user":
+            return self._response(HTTPStatus.OK, b'{"login": "test-user"}')
+        login = url.rsplit("/", 1)[-1]
+        if self.membership_status is not None:
+            return self._response(self.membership_status)
+        if login in self.members:
+            return self._response(HTTPStatus.NO_CONTENT)
+        return self._response(HTTPStatus.NOT_FOUND)
+
+    def delete(self, url, **kwargs):
+        self.calls.append(("DELETE", url))
+        return self._response(HTTPStatus.NO_CONTENT)
+
+
+@pytest.fixture
+def github(app, monkeypatch):
+    app.config["GITHUB_API_URL"] = "https://github.stub/api"
+    app.config["GITHUB_CLIENT_ID"] = "client-id"
+    monkeypatch.setattr(views, "_membership_cache", {})
+    with app.app_context():
+        monkeypatch.setattr(
+            oauth.github, "authorize_access_token", lambda: {"access_token": "token"}
+        )
+
+    def stub(members, membership_status=None):
+        github = StubGitHub(members, membership_status)
+        monkeypatch.setattr(views, "get_session", lambda: github)
+        return github
+
+    return stub
+
+
+def test_member_is_logged_in_and_membership_is_cached(client, github):
+    stub = github(members={"test-user"})
+
+    resp = client.get("/auth/authorize")
+    assert resp.status_code == 302
+    with client.session_transaction() as session:
+        assert session["user"]["login"] == "test-user"
+
+    client.get("/auth/logout")
+    client.get("/auth/authorize")
+
+    membership_checks = [url for _, url in stub.calls if "/orgs/" in url]
+    assert membership_checks == [
+        "https://github.stub/api/orgs/digital-land/members/test-user"
+    ]
+
+
+def test_non_member_grant_is_revoked(client, github):
+    stub = github(members=set())
+
+    resp = client.get("/auth/authorize")
+
+    assert resp.status_code == 302
+    with client.session_transaction() as session:
+        assert "user" not in session
+    assert ("DELETE", "https://github.stub/api/applications/client-id/grant") in (
+        stub.calls
+    )
+
+
+@pytest.mark.parametrize(
+    "status", [HTTPStatus.FORBIDDEN, HTTPStatus.SERVICE_UNAVAILABLE]
+)
+def test_github_errors_are_not_cached_or_revoked(client, github, status):
+    stub = github(members={"test-user"}, membership_status=status)
+
+    resp = client.get("/auth/authorize")
+
+    assert resp.status_code == 302
+    with client.session_transaction() as session:
+        assert "user" not in session
+    assert not [call for call in stub.calls if call[0] == "DELETE"]
+    assert views._membership_cache == {}
+
+    stub.membership_status = None
+    client.get("/auth/authorize")
+    with client.session_transaction() as session:
+        assert session["user"]["login"] == "test-user"
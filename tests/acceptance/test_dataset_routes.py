@@ -0,0 +1,547 @@
+"""
+Functional tests for dataset export routes:
+- csv download
+- paginated records page and json
+- dataset index
+- conditional requests on the exports
+- paginated history and change log
+- change feed
+- search
+- category finder
+
+These tests exercise Flask routes + database state.
+"""
+
+import csv
+import datetime
+import io
+import uuid
+
+from application.blueprints.main.views import DEFAULT_PAGE_SIZE
+from application.extensions import db
+from application.models import ChangeLog, ChangeType, Field, Record
+
+
+def test_csv_streams_all_records_in_row_order(client, app, monkeypatch, seed_dataset):
+    monkeypatch.setattr("application.blueprints.main.views.CSV_CHUNK_SIZE", 2)
+    dataset_id = seed_dataset(records=5).dataset
+
+    resp = client.get(f"/dataset/{dataset_id}.csv")
+
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.headers["Content-Type"] == "text/csv; charset=utf-8"
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [row["reference"] for row in rows] == [f"ref-{i}" for i in range(5)]
+    assert rows[0]["entity"] == "1000"
+    assert rows[0]["name"] == "Record 0"
+
+
+def test_csv_for_dataset_without_records_is_not_found(client, app, seed_dataset):
+    dataset_id = seed_dataset().dataset
+
+    resp = client.get(f"/dataset/{dataset_id}.csv")
+
+    assert resp.status_code == 404
+
+
+def test_dataset_json_pages_through_records_with_cursors(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=5).dataset
+
+    resp = client.get(f"/dataset/{dataset_id}.json?page_size=2")
+    data = resp.get_json()
+    assert [r["reference"] for r in data["records"]] == ["ref-0", "ref-1"]
+    assert data["prev"] is None
+    assert data["next"] == 1
+
+    resp = client.get(f"/dataset/{dataset_id}.json?page_size=2&after=3")
+    data = resp.get_json()
+    assert [r["reference"] for r in data["records"]] == ["ref-4"]
+    assert data["next"] is None
+    assert data["prev"] == 4
+
+    resp = client.get(f"/dataset/{dataset_id}.json?page_size=2&before=4")
+    data = resp.get_json()
+    assert [r["reference"] for r in data["records"]] == ["ref-2", "ref-3"]
+    assert data["next"] == 3
+    assert data["prev"] == 2
+
+
+def test_dataset_json_before_past_the_end_has_no_next(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=5).dataset
+
+    resp = client.get(f"/dataset/{dataset_id}.json?page_size=2&before=99")
+    data = resp.get_json()
+    assert [r["reference"] for r in data["records"]] == ["ref-3", "ref-4"]
+    assert data["next"] is None
+    assert data["links"]["next"] is None
+    assert data["prev"] == 3
+
+
+def test_dataset_json_all_returns_every_record(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=5).dataset
+
+    resp = client.get(f"/dataset/{dataset_id}.json?all=true&page_size=2")
+    data = resp.get_json()
+
+    assert len(data["records"]) == 5
+    assert "next" not in data
+
+
+def test_dataset_page_shows_total_and_next_link(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=5).dataset
+
+    resp = client.get(f"/dataset/{dataset_id}?page_size=2")
+    html = resp.get_data(as_text=True)
+
+    assert resp.status_code == 200
+    assert "5 records" in html
+    assert "ref-1" in html
+    assert "ref-2" not in html
+    assert f"/dataset/{dataset_id}?after=1&amp;page_size=2" in html
+
+
+def test_index_json_counts_records_per_dataset(client, app, seed_dataset):
+    seed_dataset("design-code-status", records=3)
+    seed_dataset("flood-risk-level")
+
+    resp = client.get("/index.json")
+    datasets = {d["dataset"]: d for d in resp.get_json()["datasets"]}
+
+    assert datasets["design-code-status"]["total_records"] == 3
+    assert datasets["flood-risk-level"]["total_records"] == 0
+
+
+def test_index_json_links_to_all_of_each_datasets_records(client, app, seed_dataset):
+    seed_dataset("design-code-status", records=DEFAULT_PAGE_SIZE + 1)
+
+    resp = client.get("/index.json")
+    (dataset,) = resp.get_json()["datasets"]
+
+    data = client.get(dataset["data"]).get_json()
+    assert len(data["records"]) == DEFAULT_PAGE_SIZE + 1
+
+
+def test_index_lists_record_counts(client, app, seed_dataset):
+    seed_dataset("design-code-status", records=3)
+
+    resp = client.get("/")
+
+    assert resp.status_code == 200
+    html = resp.get_data(as_text=True)
+    assert 'class="govuk-table__cell govuk-table__cell--numeric">3</td>' in html
+
+
+def test_exports_answer_matching_etag_with_not_modified(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=2).dataset
+
+    for url in [
+        f"/dataset/{dataset_id}.json",
+        f"/dataset/{dataset_id}.csv",
+        f"/dataset/{dataset_id}/schema.json",
+        "/index.json",
+    ]:
+        resp = client.get(url)
+        etag = resp.headers["ETag"]
+        assert resp.status_code == 200
+        assert resp.headers["Last-Modified"]
+        assert "no-cache" in resp.headers["Cache-Control"]
+
+        resp = client.get(url, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.headers["ETag"] == etag
+        assert resp.data == b""
+
+
+def test_etag_changes_when_records_change(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=2).dataset
+    etag = client.get(f"/dataset/{dataset_id}.json").headers["ETag"]
+
+    with app.app_context():
+        record = Record.query.filter(Record.dataset_id == dataset_id).first()
+        record.data["name"] = "Updated"
+        db.session.commit()
+
+    resp = client.get(f"/dataset/{dataset_id}.json", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_etag_changes_when_a_field_changes(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=1).dataset
+    seed_dataset("flood-risk-level", records=1)
+    url = f"/dataset/{dataset_id}/schema.json"
+    etag = client.get(url).headers["ETag"]
+    other_etag = client.get("/dataset/flood-risk-level/schema.json").headers["ETag"]
+
+    with app.app_context():
+        field = db.session.get(Field, "name")
+        field.description = "The name of the record"
+        db.session.commit()
+
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    fields = {field["field"]: field for field in resp.get_json()["fields"]}
+    assert fields["name"]["description"] == "The name of the record"
+    resp = client.get(
+        "/dataset/flood-risk-level/schema.json", headers={"If-None-Match": other_etag}
+    )
+    assert resp.status_code == 200
+
+
+def test_entities_json_reports_next_entity(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=3).dataset
+
+    data = client.get(f"/dataset/{dataset_id}/entities.json").get_json()
+
+    assert data["next_entity"] == 1003
+    assert data["remaining"] is None
+
+
+def _seed_history(app, dataset_id):
+    with app.app_context():
+        record = Record.query.filter(
+            Record.dataset_id == dataset_id, Record.row_id == 0
+        ).one()
+        db.session.add(
+            ChangeLog(
+                change_type=ChangeType.EDIT,
+                dataset_id=dataset_id,
+                record_id=record.id,
+                data={"from": {"name": "Old name"}, "to": {"name": "Record 0"}},
+            )
+        )
+        db.session.commit()
+
+
+def test_history_json_pages_records_with_their_changes(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=3).dataset
+    _seed_history(app, dataset_id)
+
+    data = client.get(f"/dataset/{dataset_id}/history.json?page_size=2").get_json()
+
+    assert [r["current"]["reference"] for r in data["records"]] == ["ref-0", "ref-1"]
+    assert [h["data"] for h in data["records"][0]["history"]] == [{"name": "Old name"}]
+    assert data["records"][1]["history"] == []
+    assert data["next"] == 1
+
+
+def test_history_page_shows_previous_values(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=3).dataset
+    _seed_history(app, dataset_id)
+
+    resp = client.get(f"/dataset/{dataset_id}/history?page_size=2")
+    html = resp.get_data(as_text=True)
+
+    assert resp.status_code == 200
+    assert "Old name" in html
+    assert "ref-2" not in html
+    assert f"/dataset/{dataset_id}/history?after=1&amp;page_size=2" in html
+
+
+def _seed_changes(app, dataset_id, days):
+    with app.app_context():
+        record = Record.query.filter(Record.dataset_id == dataset_id).first()
+        for day in days:
+            for change_type in [ChangeType.ADD, ChangeType.EDIT]:
+                db.session.add(
+                    ChangeLog(
+                        change_type=change_type,
+                        dataset_id=dataset_id,
+                        record_id=record.id,
+                        created_date=datetime.date(2024, 1, day),
+                        notes=f"{change_type.value} on {day}",
+                    )
+                )
+        db.session.commit()
+
+
+def test_change_log_json_pages_through_days(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=1).dataset
+    _seed_changes(app, dataset_id, [1, 2, 3])
+
+    data = client.get(f"/dataset/{dataset_id}/change-log.json?page_size=2").get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-03", "2024-01-02"]
+    assert [c["change_type"] for c in data["days"][0]["changes"]] == ["ADD", "EDIT"]
+    assert data["next"] == "2024-01-02"
+    assert data["prev"] is None
+
+    data = client.get(data["links"]["next"]).get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-01"]
+    assert data["next"] is None
+    assert data["prev"] == "2024-01-01"
+
+    data = client.get(data["links"]["prev"]).get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-03", "2024-01-02"]
+
+
+def test_change_log_json_pages_are_capped_by_changes(
+    client, app, monkeypatch, seed_dataset
+):
+    monkeypatch.setattr("application.blueprints.main.views.CHANGE_LOG_MAX_ROWS", 3)
+    dataset_id = seed_dataset(records=1).dataset
+    _seed_changes(app, dataset_id, [1, 2, 3])
+
+    data = client.get(f"/dataset/{dataset_id}/change-log.json").get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-03"]
+    assert data["next"] == "2024-01-03"
+
+    data = client.get(data["links"]["next"]).get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-02"]
+
+    data = client.get(data["links"]["prev"]).get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-03"]
+    assert data["prev"] is None
+
+
+def test_change_log_json_splits_a_day_with_too_many_changes(
+    client, app, monkeypatch, seed_dataset
+):
+    monkeypatch.setattr("application.blueprints.main.views.CHANGE_LOG_MAX_ROWS", 1)
+    dataset_id = seed_dataset(records=1).dataset
+    _seed_changes(app, dataset_id, [1, 2])
+
+    def changes(data):
+        return [
+            (day["date"], change["change_type"])
+            for day in data["days"]
+            for change in day["changes"]
+        ]
+
+    data = client.get(f"/dataset/{dataset_id}/change-log.json").get_json()
+    assert changes(data) == [("2024-01-02", "ADD")]
+    assert data["next"].startswith("2024-01-02.ADD.")
+
+    data = client.get(data["links"]["next"]).get_json()
+    assert changes(data) == [("2024-01-02", "EDIT")]
+    assert data["next"] == "2024-01-02"
+    assert data["prev"].startswith("2024-01-02.EDIT.")
+
+    data = client.get(data["links"]["next"]).get_json()
+    assert changes(data) == [("2024-01-01", "ADD")]
+
+    data = client.get(data["links"]["prev"]).get_json()
+    assert changes(data) == [("2024-01-02", "EDIT")]
+
+    data = client.get(data["links"]["prev"]).get_json()
+    assert changes(data) == [("2024-01-02", "ADD")]
+    assert data["prev"] is None
+
+
+def test_change_log_json_before_past_the_end_has_no_next(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=1).dataset
+    _seed_changes(app, dataset_id, [2, 3])
+
+    url = f"/dataset/{dataset_id}/change-log.json?before=2024-01-01&page_size=1"
+    data = client.get(url).get_json()
+    assert [day["date"] for day in data["days"]] == ["2024-01-02"]
+    assert data["next"] is None
+    assert data["prev"] == "2024-01-02"
+
+
+def test_change_log_page_links_to_older_days(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=1).dataset
+    _seed_changes(app, dataset_id, [1, 2, 3])
+
+    resp = client.get(f"/dataset/{dataset_id}/change-log?page_size=2")
+    html = resp.get_data(as_text=True)
+
+    assert resp.status_code == 200
+    assert "03 January 2024" in html
+    assert "01 January 2024" not in html
+    assert f"/dataset/{dataset_id}/change-log?after=2024-01-02&amp;page_size=2" in html
+
+
+def test_change_feed_returns_records_changed_since_cursor(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=3).dataset
+    seed_dataset("flood-risk-level", records=1)
+    with app.app_context():
+        records = Record.query.order_by(Record.dataset_id, Record.row_id).all()
+        for record in [records[1], records[0], records[1]]:
+            db.session.add(
+                ChangeLog(
+                    change_type=ChangeType.EDIT,
+                    dataset_id=record.dataset_id,
+                    record_id=record.id,
+                )
+            )
+            db.session.flush()
+        db.session.commit()
+
+    data = client.get(f"/dataset/{dataset_id}/changes.json?page_size=2").get_json()
+    assert [r["record"]["reference"] for r in data["records"]] == ["ref-1", "ref-0"]
+    assert data["more"] is True
+
+    data = client.get(data["links"]["next"]).get_json()
+    assert [r["record"]["reference"] for r in data["records"]] == ["ref-1"]
+    assert data["more"] is False
+
+    cursor = data["next"]
+    data = client.get(f"/dataset/{dataset_id}/changes.json?since={cursor}").get_json()
+    assert data["records"] == []
+    assert data["next"] == cursor
+
+    data = client.get("/changes.json").get_json()
+    assert {r["dataset"] for r in data["records"]} == {dataset_id}
+
+
+def test_change_feed_follows_commit_order_not_change_id(client, app, seed_dataset):
+    dataset_id = seed_dataset(records=2).dataset
+
+    def add_change(record_index, change_id):
+        with app.app_context():
+            record = Record.query.filter_by(reference=f"ref-{record_index}").one()
+            db.session.add(
+                ChangeLog(
+                    id=change_id,
+                    change_type=ChangeType.EDIT,
+                    dataset_id=dataset_id,
+                    record_id=record.id,
+                )
+            )
+            db.session.commit()
+
+    add_change(0, uuid.UUID(int=2**128 - 1))
+    cursor = client.get(f"/dataset/{dataset_id}/changes.json").get_json()["next"]
+
+    # sorts before the first change by id, but was committed after it
+    add_change(1, uuid.UUID(int=0xA))
+
+    data = client.get(f"/dataset/{dataset_id}/changes.json?since={cursor}").json
+    assert [r["record"]["reference"] for r in data["records"]] == ["ref-1"]
+
+
+def test_change_feed_rejects_invalid_cursor(client, app, seed_dataset):
+    dataset_id = seed_dataset().dataset
+
+    for cursor in ["yesterday", f"1718000000123456-{'0' * 32}"]:
+        resp = client.get(f"/dataset/{dataset_id}/changes.json?since={cursor}")
+        assert resp.status_code == 400
+
+
+def _seed_search(seed_dataset):
+    design = seed_dataset("design-code-status", records=3)
+    other = seed_dataset("other-status", records=0)
+    design.records[0].data = {"name": "Green belt"}
+    design.records[1].data = {"name": "Brown field"}
+    design.records[1].notes = "Previously green belt land"
+    other.records.append(
+        Record(
+            row_id=0,
+            entity=2000,
+            prefix="other-status",
+            reference="green",
+            data={"name": "Green"},
+        )
+    )
+    db.session.commit()
+
+
+def test_search_json_ranks_matching_records(client, app, seed_dataset):
+    _seed_search(seed_dataset)
+
+    data = client.get("/dataset/design-code-status/search.json?q=green+belt").json
+
+    assert data["dataset"] == "design-code-status"
+    assert [hit["record"]["reference"] for hit in data["results"]] == [
+        "ref-0",
+        "ref-1",
+    ]
+    assert data["results"][0]["rank"] >= data["results"][1]["rank"]
+    assert data["links"] == {"next": None, "prev": None}
+
+
+def test_search_json_follows_record_edits(client, app, seed_dataset):
+    _seed_search(seed_dataset)
+    with app.app_context():
+        record = Record.query.filter_by(reference="ref-2").one()
+        record.data = {"name": "Greenfield site"}
+        db.session.commit()
+
+    data = client.get("/dataset/design-code-status/search.json?q=greenfield").json
+
+    assert [hit["record"]["reference"] for hit in data["results"]] == ["ref-2"]
+    data = client.get("/dataset/design-code-status/search.json?q=record").json
+    assert [hit["record"]["reference"] for hit in data["results"]] == []
+
+
+def test_all_search_json_pages_across_datasets(client, app, seed_dataset):
+    _seed_search(seed_dataset)
+
+    data = client.get("/search.json?q=green&page_size=2").json
+
+    assert len(data["results"]) == 2
+    assert data["links"]["prev"] is None
+    assert "page=2" in data["links"]["next"]
+
+    second = client.get(data["links"]["next"]).json
+    datasets = {hit["dataset"] for hit in data["results"] + second["results"]}
+    assert datasets == {"design-code-status", "other-status"}
+    assert second["links"]["next"] is None
+    assert "page=1" in second["links"]["prev"]
+
+
+def test_search_json_without_query_returns_nothing(client, app, seed_dataset):
+    _seed_search(seed_dataset)
+
+    assert client.get("/search.json?q=").json["results"] == []
+    assert client.get("/search.json?q=%22%3A*").json["results"] == []
+
+
+def test_finder_json_queries_active_records_by_prefix(client, app, seed_dataset):
+    _seed_search(seed_dataset)
+    with app.app_context():
+        record = Record.query.filter_by(reference="ref-2").one()
+        record.end_date = datetime.date(2024, 1, 1)
+        db.session.commit()
+
+    data = client.get("/dataset/design-code-status/finder.json").json
+    assert [entry["name"] for entry in data["results"]] == [
+        "Brown field",
+        "Green belt",
+    ]
+    assert data["total"] == 2
+
+    data = client.get("/dataset/design-code-status/finder.json?q=gre").json
+    assert [entry["reference"] for entry in data["results"]] == ["ref-0"]
+
+
+def test_finder_json_is_rebuilt_when_the_dataset_changes(client, app, seed_dataset):
+    _seed_search(seed_dataset)
+    data = client.get("/dataset/design-code-status/finder.json?q=grey").json
+    assert data["results"] == []
+
+    with app.app_context():
+        record = Record.query.filter_by(reference="ref-2").one()
+        record.data = {"name": "Grey belt"}
+        db.session.commit()
+
+    data = client.get("/dataset/design-code-status/finder.json?q=grey").json
+    assert [entry["reference"] for entry in data["results"]] == ["ref-2"]
+
+
+def test_finder_json_pages_through_matches(client, app, seed_dataset):
+    seed_dataset(records=5)
+
+    data = client.get("/dataset/design-code-status/finder.json?page_size=2").json
+
+    assert len(data["results"]) == 2
+    assert data["total"] == 5
+    second = client.get(data["links"]["next"]).json
+    assert [entry["reference"] for entry in second["results"]] == ["ref-2", "ref-3"]
+
+
+def test_finder_page_shows_first_page_of_records(
+    client, app, monkeypatch, seed_dataset
+):
+    monkeypatch.setattr("application.blueprints.main.views.FINDER_PAGE_SIZE", 2)
+    seed_dataset(records=5)
+
+    resp = client.get("/dataset/design-code-status/finder")
+
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert "Record 1" in body
+    assert "Record 2" not in body
+    assert 'data-finder="total">5<' in body
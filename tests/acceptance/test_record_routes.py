@@ -1,5 +1,6 @@
 """
 Functional tests for record routes:
+- add (including the entity)
 - edit (including end-date)
 
 These tests exercise Flask routes + database state.
@@ -7,6 +8,7 @@ These tests exercise Flask routes + database state.
 import datetime
 import uuid
 
+from application.entities import next_entity
 from application.extensions import db
 from application.models import ChangeLog, ChangeType, Dataset, Field, Record
 
@@ -243,3 +245,76 @@ def test_edit_post_records_github_login(client, app):
             .first()
         )
         assert change.github_login == "test-user"
+
+
+def _seed_add_dataset(app, dataset_id="design-code-status"):
+    with app.app_context():
+        dataset = Dataset(
+            dataset=dataset_id,
+            name="Design code status",
+            entity_minimum=100,
+            entity_maximum=199,
+        )
+        for field, datatype in [
+            ("entity", "integer"),
+            ("name", "string"),
+            ("reference", "string"),
+        ]:
+            dataset.fields.append(Field(field=field, name=field, datatype=datatype))
+        db.session.add(dataset)
+        db.session.commit()
+    return dataset_id
+
+
+def test_add_post_keeps_the_submitted_entity(client, app):
+    _login(client)
+    dataset_id = _seed_add_dataset(app)
+
+    resp = client.post(
+        f"/dataset/{dataset_id}/add",
+        data={"entity": "150", "name": "Typed", "reference": "typed"},
+    )
+
+    assert resp.status_code in (302, 303)
+    with app.app_context():
+        record = Record.query.filter_by(reference="typed").one()
+        assert record.entity == 150
+        assert next_entity(db.session.get(Dataset, dataset_id)) == 151
+
+
+def test_add_post_reserves_an_entity_when_none_is_given(client, app):
+    _login(client)
+    dataset_id = _seed_add_dataset(app)
+
+    client.post(
+        f"/dataset/{dataset_id}/add",
+        data={"name": "Blank", "reference": "blank"},
+    )
+
+    with app.app_context():
+        assert Record.query.filter_by(reference="blank").one().entity == 100
+
+
+def test_add_post_rejects_an_entity_out_of_range_or_in_use(client, app):
+    _login(client)
+    dataset_id = _seed_add_dataset(app)
+    client.post(
+        f"/dataset/{dataset_id}/add",
+        data={"entity": "150", "name": "First", "reference": "first"},
+    )
+
+    for entity in ["250", "150"]:
+        resp = client.post(
+            f"/dataset/{dataset_id}/add",
+            data={"entity": entity, "name": "Second", "reference": "second"},
+        )
+        assert resp.status_code in (302, 303)
+
+    with client.session_transaction() as session:
+        messages = [message for _, message in session["_flashes"]]
+    assert messages == [
+        "entity id 250 is outside of range 100 to 199",
+        "entity 150 is already in use",
+    ]
+    with app.app_context():
+        assert Record.query.filter_by(reference="second").count() == 0
@@ -0,0 +1,262 @@
+"""
+Functional tests for upload routes:
+- csv upload of a new register
+- csv upload of updates
+- background jobs
+
+These tests exercise Flask routes + database state.
+"""
+
+import datetime
+import io
+
+import pytest
+from sqlalchemy import update
+
+from application import ingest, jobs
+from application.extensions import db
+from application.models import (
+    ChangeLog,
+    Job,
+    JobStatus,
+    JobType,
+    Record,
+    Update,
+    UpdateStatus,
+)
+from application.utils import utc_now
+
+FIELDS = [
+    ("entity", "integer"),
+    ("name", "string"),
+    ("reference", "string"),
+    ("end-date", "datetime"),
+]
+
+
+def _login(client):
+    with client.session_transaction() as session:
+        session["user"] = {"email": "test@example.com", "login": "test-user"}
+
+
+@pytest.fixture
+def dataset_id(seed_dataset):
+    return seed_dataset(fields=FIELDS, entity_minimum=1000, entity_maximum=1999).dataset
+
+
+def _upload(client, dataset_id, content, action="upload"):
+    return client.post(
+        f"/dataset/{dataset_id}/{action}",
+        data={"csv_file": (io.BytesIO(content.encode()), "upload.csv")},
+        content_type="multipart/form-data",
+    )
+
+
+def test_upload_creates_records_and_change_logs(client, app, dataset_id):
+    _login(client)
+
+    resp = _upload(
+        client,
+        dataset_id,
+        "entity,name,reference,end-date\n"
+        "1000,First,one,\n"
+        ",Second,two,\n"
+        "1000,First (old),one,2020-01-01\n",
+    )
+
+    assert resp.status_code == 302
+    with app.app_context():
+        records = Record.query.order_by(Record.row_id).all()
+        assert [(r.reference, r.entity, r.row_id) for r in records] == [
+            ("one", 1000, 0),
+            ("two", 1001, 1),
+        ]
+        # the ended row is the original, the active row is applied as an edit
+        assert records[0].data["name"] == "First"
+        assert records[0].end_date is None
+        change_logs = ChangeLog.query.all()
+        assert len(change_logs) == 1
+        assert change_logs[0].record_id == records[0].id
+        assert change_logs[0].dataset_id == dataset_id
+
+
+def test_upload_rolls_back_everything_on_error(client, app, monkeypatch, dataset_id):
+    _login(client)
+    inserted = []
+    bulk_insert = ingest.bulk_insert
+
+    def failing_bulk_insert(model, objects, progress=None):
+        if model is ChangeLog:
+            raise RuntimeError("change log insert failed")
+        bulk_insert(model, objects, progress)
+        inserted.append((model, len(objects)))
+
+    monkeypatch.setattr(ingest, "bulk_insert", failing_bulk_insert)
+
+    resp = _upload(
+        client,
+        dataset_id,
+        "entity,name,reference,end-date\n1000,First,one,\n1001,Second,two,\n",
+    )
+    resp = client.get(resp.location)
+
+    assert "Failed" in resp.get_data(as_text=True)
+    assert inserted == [(Record, 2)]
+    with app.app_context():
+        assert Job.query.one().status == JobStatus.FAILED
+        assert Record.query.count() == 0
+        assert ChangeLog.query.count() == 0
+
+
+def test_upload_is_queued_for_the_worker(client, app, dataset_id):
+    app.config["JOBS_INLINE"] = False
+    _login(client)
+
+    resp = _upload(client, dataset_id, "entity,name,reference,end-date\n,First,one,\n")
+
+    job = client.get(f"{resp.location}.json").get_json()
+    assert job["status"] == "PENDING"
+    assert job["total"] == 1
+    with app.app_context():
+        assert Record.query.count() == 0
+
+    result = app.test_cli_runner().invoke(args=["data", "worker", "--once"])
+    assert result.exit_code == 0
+
+    job = client.get(f"{resp.location}.json").get_json()
+    assert job["status"] == "COMPLETE"
+    assert job["processed"] == 1
+    assert job["next"] == f"/dataset/{dataset_id}"
+    with app.app_context():
+        assert Record.query.one().reference == "one"
+
+
+def test_update_is_checked_then_applied(client, app, dataset_id):
+    _login(client)
+    _upload(client, dataset_id, "entity,name,reference,end-date\n1000,First,one,\n")
+
+    resp = _upload(
+        client,
+        dataset_id,
+        "entity,name,reference,end-date\n1000,Renamed,one,\n1001,Second,two,\n",
+        action="update",
+    )
+    job = client.get(f"{resp.location}.json").get_json()
+    assert job["status"] == "COMPLETE"
+
+    resp = client.get(job["next"])
+    assert "Updated from &#39;First&#39; to &#39;Renamed&#39;" in resp.get_data(
+        as_text=True
+    )
+
+    with app.app_context():
+        update = Update.query.one()
+        record_ids = [str(record.id) for record in update.records]
+    resp = client.post(job["next"], data={"record_id": record_ids})
+    job = client.get(f"{resp.location}.json").get_json()
+    assert job["status"] == "COMPLETE"
+    assert job["result"]["applied"] == 2
+
+    with app.app_context():
+        assert Update.query.one().status == UpdateStatus.COMPLETE
+        records = Record.query.order_by(Record.entity).all()
+        assert [(r.entity, r.data["name"]) for r in records] == [
+            (1000, "Renamed"),
+            (1001, "Second"),
+        ]
+
+
+def test_jobs_report_progress_per_batch(client, app, monkeypatch, dataset_id):
+    reported = []
+    monkeypatch.setattr(ingest, "BATCH_SIZE", 1)
+    monkeypatch.setattr(
+        jobs,
+        "_write_progress",
+        lambda job_id, attempt, processed: reported.append(processed),
+    )
+    _login(client)
+
+    _upload(
+        client,
+        dataset_id,
+        "entity,name,reference,end-date\n"
+        "1000,First,one,\n"
+        ",Second,two,\n"
+        "1000,First (old),one,2020-01-01\n",
+    )
+    # a heartbeat for each reference built, then each batch written
+    assert reported == [0, 0, 1, 2, 3]
+
+    reported.clear()
+    resp = _upload(
+        client,
+        dataset_id,
+        "entity,name,reference,end-date\n1000,Renamed,one,\n1002,Third,three,\n",
+        action="update",
+    )
+    assert reported == [1, 2]
+
+    reported.clear()
+    job = client.get(f"{resp.location}.json").get_json()
+    with app.app_context():
+        record_ids = [str(record.id) for record in Update.query.one().records]
+    client.post(job["next"], data={"record_id": record_ids})
+    assert reported == [1, 2]
+
+
+def _seed_job(app, dataset_id, status, heartbeat=None, attempts=0):
+    with app.app_context():
+        job = Job(
+            dataset_id=dataset_id,
+            job_type=JobType.UPLOAD,
+            status=status,
+            data={"rows": []},
+            heartbeat=heartbeat,
+            attempts=attempts,
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def test_worker_reclaims_jobs_left_running_by_a_stopped_worker(app, dataset_id):
+    long_ago = utc_now() - datetime.timedelta(hours=1)
+    stale = _seed_job(app, dataset_id, JobStatus.RUNNING, long_ago, attempts=1)
+    _seed_job(app, dataset_id, JobStatus.RUNNING, utc_now(), attempts=1)
+    exhausted = _seed_job(app, dataset_id, JobStatus.RUNNING, long_ago, attempts=3)
+
+    with app.app_context():
+        job = jobs.claim_next()
+        assert job.id == stale
+        assert job.attempts == 2
+        assert jobs.claim_next() is None
+
+        job = db.session.get(Job, exhausted)
+        assert job.status == JobStatus.FAILED
+        assert job.error == "The worker stopped while running this job"
+
+
+def test_job_claimed_again_while_running_does_not_commit(
+    client, app, monkeypatch, dataset_id
+):
+    app.config["JOBS_INLINE"] = False
+    _login(client)
+    _upload(client, dataset_id, "entity,name,reference,end-date\n,First,one,\n")
+    upload = jobs.handlers[JobType.UPLOAD]
+
+    def overtaken_upload(job):
+        result = upload(job)
+        # another worker reclaims the job before this run commits
+        db.session.execute(
+            update(Job).where(Job.id == job.id).values(attempts=Job.attempts + 1)
+        )
+        return result
+
+    monkeypatch.setitem(jobs.handlers, JobType.UPLOAD, overtaken_upload)
+    with app.app_context():
+        job = jobs.claim_next()
+        jobs.run(job)
+
+    with app.app_context():
+        assert Record.query.count() == 0
+        assert Job.query.one().status == JobStatus.RUNNING
@@ -1,5 +1,16 @@
 import pytest
 
+from application.extensions import db
+from application.models import Dataset, Field, Record
+
+DATASET_FIELDS = [
+    ("entity", "integer"),
+    ("name", "string"),
+    ("prefix", "string"),
+    ("reference", "string"),
+    ("entry-date", "datetime"),
+]
+
 
 @pytest.fixture
 def app():
@@ -18,7 +29,6 @@ def app():
 def client(app):
     return app.test_client()
 
-from application.extensions import db
 
 @pytest.fixture(autouse=True)
 def db_session(app):
@@ -27,3 +37,42 @@ def db_session(app):
         yield
         db.session.remove()
         db.drop_all()
+
+
+@pytest.fixture
+def seed_dataset():
+    """
+    Returns a function that adds a dataset with the given fields and
+    ``records`` rows numbered from row_id 0 and entity 1000.
+    """
+
+    def seed(
+        dataset_id="design-code-status", records=0, fields=DATASET_FIELDS, **columns
+    ):
+        columns.setdefault("name", "Design code status")
+        dataset = Dataset(dataset=dataset_id, **columns)
+        db.session.add(dataset)
+        for field, datatype in fields:
+            dataset.fields.append(
+                db.session.get(Field, field)
+                or Field(field=field, name=field, datatype=datatype)
+            )
+        for row_id in range(records):
+            dataset.records.append(
+                Record(
+                    row_id=row_id,
+                    entity=1000 + row_id,
+                    prefix=dataset_id,
+                    reference=f"ref-{row_id}",
+                    data={"name": f"Record {row_id}"},
+                )
+            )
+        db.session.commit()
+        return dataset
+
+    return seed
+
+
+@pytest.fixture
+def dataset(seed_dataset):
+    return seed_dataset()
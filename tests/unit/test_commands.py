@@ -0,0 +1,147 @@
+import json
+
+import pytest
+import requests
+
+from application import commands, specification
+from application.extensions import db
+from application.models import Dataset, Field, Reference
+
+SPECIFICATION = """---
+fields:
+- field: entity
+- field: name
+- field: reference
+---
+"""
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        resp = requests.Response()
+        if url in self.responses:
+            resp.status_code = 200
+            resp._content = self.responses[url].encode()
+        else:
+            resp.status_code = 404
+        return resp
+
+    def map(self, func, items):
+        return [func(item) for item in items]
+
+    def report(self):
+        return ""
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def stub(responses):
+        client = FakeClient(responses)
+        monkeypatch.setattr(commands, "HttpClient", lambda: client)
+        return client
+
+    return stub
+
+
+def test_dataset_fields_fetches_new_fields_in_one_query(app, client, tmp_path):
+    app.config["SPECIFICATION_CACHE_DIR"] = str(tmp_path)
+    for dataset_id in ["design-code-status", "flood-risk-level"]:
+        db.session.add(Dataset(dataset=dataset_id, name=dataset_id))
+    db.session.add(Field(field="entity", name="Entity", datatype="integer"))
+    db.session.commit()
+    responses = {
+        specification.specfication_markdown_url.format(
+            base_git_content_url=specification.base_git_content_url,
+            dataset=dataset_id,
+        ): SPECIFICATION
+        for dataset_id in ["design-code-status", "flood-risk-level"]
+    }
+    field_definitions = f"{commands.fields_query}&field__in=name%2Creference"
+    responses[field_definitions] = json.dumps(
+        {
+            "rows": [
+                {"field": "name", "datatype": "string"},
+                {"field": "reference", "datatype": "string", "description": "Ref"},
+            ]
+        }
+    )
+    stub = client(responses)
+
+    result = app.test_cli_runner().invoke(args=["data", "dataset-fields"])
+
+    assert result.exit_code == 0, result.output
+    for dataset_id in ["design-code-status", "flood-risk-level"]:
+        dataset = db.session.get(Dataset, dataset_id)
+        assert sorted(f.field for f in dataset.fields) == [
+            "entity",
+            "name",
+            "reference",
+        ]
+    assert [url for url in stub.urls if "field.json" in url] == [field_definitions]
+    assert db.session.get(Field, "reference").description == "Ref"
+
+
+def test_set_references_pages_through_datasette_once(app, client):
+    for dataset_id in ["design-code-status", "design-code", "local-plan"]:
+        db.session.add(Dataset(dataset=dataset_id, name=dataset_id))
+    db.session.add(
+        Reference(
+            dataset_id="design-code-status",
+            referenced_by="design-code",
+            specification="design-code",
+        )
+    )
+    db.session.commit()
+    next_page = f"{commands.dataset_field_table}&_next=2"
+    stub = client(
+        {
+            commands.dataset_field_table: json.dumps(
+                {
+                    "rows": [
+                        {
+                            "dataset": "design-code",
+                            "field": "design-code-status",
+                            "field_dataset": "design-code-status",
+                        }
+                    ],
+                    "next_url": next_page,
+                }
+            ),
+            next_page: json.dumps(
+                {
+                    "rows": [
+                        {
+                            "dataset": "local-plan",
+                            "field": "design-code",
+                            "field_dataset": "",
+                        }
+                    ]
+                }
+            ),
+            commands.specification_dataset_table: json.dumps(
+                {
+                    "rows": [
+                        {"specification": "design-code", "dataset": "design-code"},
+                        {"specification": "local-plan", "dataset": "local-plan"},
+                    ]
+                }
+            ),
+        }
+    )
+
+    result = app.test_cli_runner().invoke(args=["data", "set-references"])
+
+    assert result.exit_code == 0, result.output
+    assert len(stub.urls) == 3
+    references = {
+        (r.dataset_id, r.referenced_by, r.specification) for r in Reference.query.all()
+    }
+    assert references == {
+        ("design-code-status", "design-code", "design-code"),
+        ("design-code", "local-plan", "local-plan"),
+    }
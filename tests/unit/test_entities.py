@@ -0,0 +1,85 @@
+import pytest
+
+from application import entities
+from application.entities import (
+    allocation_session,
+    claim_entity,
+    next_entity,
+    remaining_entities,
+    reserve_entities,
+    reserve_row_ids,
+)
+from application.extensions import db
+from application.ingest import build_records
+from application.models import EntitySequence
+
+
+@pytest.fixture
+def dataset(seed_dataset):
+    return seed_dataset(records=5, entity_minimum=1000, entity_maximum=1029)
+
+
+def test_sequence_starts_after_existing_records(dataset):
+    assert next_entity(dataset) == 1005
+    assert remaining_entities(dataset) == 25
+    assert db.session.get(EntitySequence, dataset.dataset) is None
+
+
+def test_reserve_entities_hands_out_consecutive_blocks(dataset):
+    assert reserve_entities(dataset) == range(1005, 1006)
+    assert reserve_entities(dataset, 3) == range(1006, 1009)
+    db.session.commit()
+
+    assert next_entity(dataset) == 1009
+    assert remaining_entities(dataset) == 21
+
+
+def test_reserve_entities_starts_after_supplied_entity(dataset):
+    assert reserve_entities(dataset, 2, after=1020) == range(1021, 1023)
+    assert reserve_entities(dataset, 1, after=1010) == range(1023, 1024)
+
+
+def test_reserve_entities_stops_at_entity_maximum(dataset):
+    reserve_entities(dataset, 25)
+
+    with pytest.raises(ValueError):
+        reserve_entities(dataset)
+    assert remaining_entities(dataset) == 0
+
+
+def test_reserve_row_ids_starts_after_existing_records(dataset):
+    assert reserve_row_ids(dataset) == range(5, 6)
+    assert reserve_row_ids(dataset, 3) == range(6, 9)
+    assert db.session.get(EntitySequence, dataset.dataset).next_row_id == 9
+
+
+def test_claim_entity_rejects_entity_in_use(dataset):
+    assert claim_entity(dataset, 1010) == 1010
+    assert next_entity(dataset) == 1011
+
+    with pytest.raises(ValueError):
+        claim_entity(dataset, 1002)
+
+
+def test_build_records_reserves_one_block_for_missing_entities(app, dataset):
+    rows = [
+        {"reference": "a", "entity": ""},
+        {"reference": "b", "entity": "1015"},
+        {"reference": "c", "entity": ""},
+    ]
+
+    records, _ = build_records(dataset, rows, app.config)
+
+    assert [r.entity for r in records] == [1016, 1015, 1017]
+    assert next_entity(dataset) == 1018
+
+
+def test_allocation_session_commits_before_the_job_does(dataset, monkeypatch):
+    # on Postgres the reservation is made on a connection of its own
+    monkeypatch.setattr(entities, "_shares_connection", lambda: False)
+
+    with allocation_session() as session:
+        assert reserve_entities(dataset, 2, session=session) == range(1005, 1007)
+    db.session.rollback()
+
+    assert next_entity(dataset) == 1007
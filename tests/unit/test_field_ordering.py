@@ -1,6 +1,6 @@
 import pytest
 
-from application.models import Field
+from application.models import Dataset, Field
 
 expected_order = [
     "entity",
@@ -71,3 +71,23 @@ def test_field_ordering(fields):
 
     for i, field in enumerate(ordered):
         assert field.field == expected_order[i]
+
+
+def test_dataset_sorted_fields(fields):
+    dataset = Dataset(dataset="test", name="Test")
+    dataset.fields = fields
+
+    assert [field.field for field in dataset.sorted_fields()] == expected_order
+
+
+def test_dataset_sorted_fields_refreshed_when_fields_change(fields):
+    dataset = Dataset(dataset="test", name="Test")
+    dataset.fields = fields
+    dataset.sorted_fields()
+
+    dataset.fields.append(Field(field="address", name="Address", datatype="string"))
+    ordered = [field.field for field in dataset.sorted_fields()]
+    assert ordered.index("address") == expected_order.index("reference") + 1
+
+    dataset.fields.remove(next(f for f in dataset.fields if f.field == "address"))
+    assert [field.field for field in dataset.sorted_fields()] == expected_order
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from application.finder import FinderIndex
+
+
+def _record(name, reference, description=None):
+    return SimpleNamespace(
+        entity=None, data={"name": name}, reference=reference, description=description
+    )
+
+
+def _index():
+    return FinderIndex(
+        [
+            _record("Open space", "open-space"),
+            _record("Green belt", "green-belt", "Protected land"),
+            _record("Brownfield land", "brownfield"),
+            _record("Greenfield land", "greenfield"),
+        ]
+    )
+
+
+def test_empty_query_returns_entries_in_name_order():
+    entries, total = _index().search("", limit=2)
+
+    assert [entry["name"] for entry in entries] == ["Brownfield land", "Green belt"]
+    assert total == 4
+
+
+def test_query_matches_word_prefixes_of_names_and_references():
+    entries, total = _index().search("gre")
+
+    assert [entry["reference"] for entry in entries] == ["green-belt", "greenfield"]
+    assert total == 2
+    assert entries[0]["description"] == "Protected land"
+
+
+def test_every_query_word_must_match():
+    assert _index().search("LAND bro")[0][0]["reference"] == "brownfield"
+    assert _index().search("land belt") == ([], 0)
+
+
+def test_offset_pages_through_matches():
+    entries, total = _index().search("land", limit=1, offset=1)
+
+    assert [entry["name"] for entry in entries] == ["Greenfield land"]
+    assert total == 2
@@ -116,3 +116,54 @@ def test_entity_field_is_editable(app):
         # editor changing it
         form.entity.data = 110
         assert form.entity.data == 110
+
+
+def test_form_class_is_cached_per_dataset_schema(app):
+    with app.test_request_context():
+        fields = [
+            Field(field="reference", datatype="string", name="Reference"),
+            Field(field="name", datatype="string", name="Name"),
+        ]
+        first = FormBuilder(fields, dataset="cached-dataset").build()
+        second = FormBuilder(list(fields), dataset="cached-dataset").build()
+        edit = FormBuilder(
+            fields, include_edit_notes=True, dataset="cached-dataset"
+        ).build()
+
+        assert type(first) is type(second)
+        assert first is not second
+        assert type(edit) is not type(first)
+        assert hasattr(edit, "edit_notes")
+        assert not hasattr(first, "edit_notes")
+
+
+def test_form_class_is_rebuilt_when_fields_change(app):
+    with app.test_request_context():
+        fields = [Field(field="name", datatype="string", name="Name")]
+        before = FormBuilder(fields, dataset="changing-dataset").build()
+
+        fields.append(Field(field="notes", datatype="text", name="Notes"))
+        builder = FormBuilder(fields, dataset="changing-dataset")
+        after = builder.build()
+
+        assert type(after) is not type(before)
+        assert hasattr(after, "notes")
+        assert [field.field for field in builder.form_fields()] == ["name", "notes"]
+
+
+def test_form_fields_are_the_builders_own_fields_in_display_order(app):
+    with app.test_request_context():
+        fields = [
+            Field(field="notes", datatype="text", name="Notes"),
+            Field(field="reference", datatype="string", name="Reference"),
+        ]
+        FormBuilder(fields, dataset="ordered-dataset").form_fields()
+
+        fresh = [
+            Field(field="notes", datatype="text", name="Notes"),
+            Field(field="reference", datatype="string", name="Reference"),
+        ]
+        form_fields = FormBuilder(fresh, dataset="ordered-dataset").form_fields()
+
+        assert [field.field for field in form_fields] == ["reference", "notes"]
+        assert all(a is b for a, b in zip(form_fields, reversed(fresh)))
@@ -0,0 +1,55 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from application.http_client import HttpClient
+
+
+@pytest.fixture
+def server():
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            # /flaky fails on its first request
+            if self.path == "/flaky" and hits[self.path] == 1:
+                self.send_response(503)
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(self.path)))
+            self.end_headers()
+            self.wfile.write(self.path.encode())
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", hits
+    httpd.shutdown()
+
+
+def test_map_returns_results_in_order(server):
+    url, _ = server
+    client = HttpClient(max_workers=4)
+
+    paths = [f"/{i}" for i in range(10)]
+    texts = client.map(lambda path: client.get(f"{url}{path}").text, paths)
+
+    assert texts == paths
+    host = url.split("//")[1]
+    assert client.stats[host][0] == 10
+    assert f"{host}: 10 requests, 0 errors" in client.report()
+
+
+def test_get_retries_server_errors(server):
+    url, hits = server
+    client = HttpClient(backoff_factor=0)
+
+    resp = client.get(f"{url}/flaky")
+
+    assert resp.status_code == 200
+    assert hits["/flaky"] == 2
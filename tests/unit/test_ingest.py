@@ -0,0 +1,111 @@
+import pytest
+from sqlalchemy import event
+
+from application.extensions import db
+from application.entities import reserve_row_ids
+from application.ingest import apply_update, check_update, stage_update
+from application.models import ChangeLog, ChangeType, Record, UpdateStatus
+
+
+@pytest.fixture
+def dataset(seed_dataset):
+    return seed_dataset(
+        records=20,
+        fields=[("entity", "string"), ("name", "string"), ("reference", "string")],
+    )
+
+
+@pytest.fixture
+def count_queries(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_check_update_finds_changes_and_new_records(dataset):
+    rows = [
+        {"entity": "1000", "name": "Renamed", "reference": "ref-0"},
+        {"entity": "1001", "name": "Record 1", "reference": "ref-1"},
+        {"entity": "2000", "name": "New", "reference": "ref-2000"},
+        {"entity": "1002", "name": "Record 2"},
+    ]
+    update = stage_update(dataset, rows)
+    db.session.commit()
+
+    check_update(update)
+
+    changes = [(r.changes, r.new_record) for r in update.records]
+    assert changes == [
+        ({"name": "Updated from 'Record 0' to 'Renamed'"}, False),
+        ({}, False),
+        (None, True),
+        ({"error": "The fields don't match the specification"}, False),
+    ]
+
+
+def test_check_update_query_count_does_not_grow_with_rows(dataset, count_queries):
+    rows = [
+        {"entity": str(entity), "name": "Renamed", "reference": f"ref-{entity - 1000}"}
+        for entity in range(1000, 1020)
+    ]
+    update = stage_update(dataset, rows)
+    db.session.commit()
+    update = db.session.get(type(update), update.id)
+    count_queries.clear()
+
+    check_update(update)
+    db.session.commit()
+
+    selects = [s for s in count_queries if s.lstrip().upper().startswith("SELECT")]
+    # update records, current records, dataset and its fields
+    assert len(selects) <= 4
+    assert all(r.changes for r in update.records)
+
+
+def test_apply_update_allocates_contiguous_row_ids(app, dataset):
+    rows = [
+        {"entity": "1000", "name": "Renamed", "reference": "ref-0"},
+        {"entity": "2000", "name": "New", "reference": "ref-2000"},
+        {"entity": "2001", "name": "Newer", "reference": "ref-2001"},
+    ]
+    update = stage_update(dataset, rows)
+    db.session.commit()
+    selected = {str(r.id) for r in update.records}
+
+    applied = apply_update(update, selected, app.config, "test-user")
+    db.session.commit()
+
+    assert applied == 3
+    assert update.status == UpdateStatus.COMPLETE
+    assert all(r.processed for r in update.records)
+    new_records = Record.query.filter(Record.entity >= 2000).order_by(Record.entity)
+    assert [(r.row_id, r.data["name"]) for r in new_records] == [
+        (20, "New"),
+        (21, "Newer"),
+    ]
+    edited = Record.query.filter(Record.entity == 1000).one()
+    assert edited.data["name"] == "Renamed"
+    assert ChangeLog.query.filter(ChangeLog.change_type == ChangeType.ADD).count() == 2
+    change_log = ChangeLog.query.filter(ChangeLog.change_type == ChangeType.EDIT).one()
+    assert change_log.record_id == edited.id
+    assert change_log.dataset_id == dataset.dataset
+    assert change_log.github_login == "test-user"
+
+
+def test_apply_update_skips_row_ids_reserved_by_another_job(app, dataset):
+    update = stage_update(
+        dataset, [{"entity": "2000", "name": "New", "reference": "ref-2000"}]
+    )
+    db.session.commit()
+    # reserved by a job that hasn't written its records yet
+    assert reserve_row_ids(dataset, 5) == range(20, 25)
+    db.session.commit()
+
+    apply_update(update, {str(r.id) for r in update.records}, app.config)
+
+    assert Record.query.filter(Record.entity == 2000).one().row_id == 25
@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+import requests
+
+from application import platform
+from application.extensions import db
+from application.models import PlatformStatus
+from application.utils import utc_now
+
+
+class FakeSession:
+    def __init__(self, status_code=200, error=None):
+        self.status_code = status_code
+        self.error = error
+        self.calls = []
+
+    def head(self, url, **kwargs):
+        self.calls.append(("HEAD", url, kwargs))
+        if self.error:
+            raise self.error
+        resp = requests.Response()
+        resp.status_code = self.status_code
+        resp.url = url
+        return resp
+
+
+@pytest.fixture(autouse=True)
+def platform_url(app):
+    app.config["PLATFORM_URL"] = "https://platform.example"
+
+
+def test_refresh_heads_the_platform_with_a_timeout(dataset, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(platform, "get_session", lambda: session)
+
+    assert platform.refresh_platform_status(dataset.dataset) is True
+
+    method, url, kwargs = session.calls[0]
+    assert (method, url) == (
+        "HEAD",
+        "https://platform.example/dataset/design-code-status",
+    )
+    assert kwargs["timeout"] == 3
+    assert db.session.get(PlatformStatus, dataset.dataset).available is True
+
+
+@pytest.mark.parametrize(
+    "session",
+    [FakeSession(status_code=404), FakeSession(error=requests.Timeout())],
+)
+def test_refresh_stores_unavailable_on_error(dataset, monkeypatch, session):
+    monkeypatch.setattr(platform, "get_session", lambda: session)
+
+    assert platform.refresh_platform_status(dataset.dataset) is False
+    assert db.session.get(PlatformStatus, dataset.dataset).available is False
+
+
+def test_stale_status_is_refreshed_in_background(app, dataset, monkeypatch):
+    app.config["PLATFORM_CHECK_IN_BACKGROUND"] = True
+    queued = []
+    monkeypatch.setattr(
+        platform, "_refresh_in_background", lambda dataset_id: queued.append(dataset_id)
+    )
+    db.session.add(
+        PlatformStatus(
+            dataset_id=dataset.dataset,
+            available=True,
+            checked=utc_now() - datetime.timedelta(days=1),
+        )
+    )
+    db.session.commit()
+
+    status = platform.platform_status(dataset.dataset)
+
+    assert status.available is True
+    assert queued == [dataset.dataset]
+
+
+def test_links_page_does_not_wait_on_the_platform(client, dataset, monkeypatch):
+    def fail():
+        raise AssertionError("links page made a request")
+
+    monkeypatch.setattr(platform, "get_session", fail)
+
+    resp = client.get(f"/dataset/{dataset.dataset}/links")
+    assert resp.status_code == 200
+    assert "Dataset on the platform" not in resp.get_data(as_text=True)
+
+    db.session.add(PlatformStatus(dataset_id=dataset.dataset, available=True))
+    db.session.commit()
+
+    resp = client.get(f"/dataset/{dataset.dataset}/links")
+    assert "https://platform.example/dataset/design-code-status" in resp.get_data(
+        as_text=True
+    )
@@ -0,0 +1,21 @@
+from application.query_plans import check_query_plans, sequential_scans
+
+
+def test_key_queries_use_indexes(app):
+    with app.app_context():
+        results = check_query_plans()
+
+    assert results
+    for name, (plan, scanned) in results.items():
+        assert scanned == set(), f"{name}: {plan}"
+
+
+def test_sequential_scans_are_detected():
+    assert sequential_scans(["SCAN record"]) == {"record"}
+    assert sequential_scans(
+        ["Limit  (cost=0.00..1.00)", "  ->  Seq Scan on change_log  (cost=0.00..1.00)"]
+    ) == {"change_log"}
+    assert (
+        sequential_scans(["SEARCH record USING INDEX ix_record_dataset_id_row_id"])
+        == set()
+    )
@@ -0,0 +1,213 @@
+import csv
+from types import SimpleNamespace
+
+import pytest
+
+from application.extensions import db
+from application.models import RegisterExport
+from application.registers import (
+    export_registers,
+    file_sha256,
+    git_blob_sha,
+    push_changed_registers,
+)
+
+
+@pytest.fixture
+def dataset(seed_dataset):
+    return seed_dataset(records=3)
+
+
+def test_export_registers_writes_file_and_records_export(dataset, tmp_path):
+    results = export_registers(tmp_path, workers=1)
+
+    file_path = tmp_path / "design-code-status.csv"
+    assert results == [("design-code-status", "exported", file_path)]
+    with open(file_path) as f:
+        rows = list(csv.DictReader(f))
+    assert [row["reference"] for row in rows] == ["ref-0", "ref-1", "ref-2"]
+    assert rows[0]["name"] == "Record 0"
+
+    export = db.session.get(RegisterExport, "design-code-status")
+    assert export.version == dataset.version
+    assert export.sha256 == file_sha256(file_path)
+    assert export.pushed_sha256 is None
+    assert [p.name for p in tmp_path.iterdir()] == ["design-code-status.csv"]
+
+
+def test_export_registers_skips_unchanged_datasets(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+
+    results = export_registers(tmp_path, workers=1)
+    assert [status for _, status, _ in results] == ["unchanged"]
+
+    results = export_registers(tmp_path, workers=1, force=True)
+    assert [status for _, status, _ in results] == ["exported"]
+
+
+def test_export_registers_exports_again_after_an_edit(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+
+    record = dataset.records[0]
+    record.data = {"name": "Renamed"}
+    db.session.commit()
+
+    results = export_registers(tmp_path, workers=1)
+    assert [status for _, status, _ in results] == ["exported"]
+    with open(tmp_path / "design-code-status.csv") as f:
+        assert "Renamed" in f.read()
+
+
+def test_export_registers_replaces_a_modified_file(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+    file_path = tmp_path / "design-code-status.csv"
+    file_path.write_text("truncated")
+
+    results = export_registers(tmp_path, workers=1)
+    assert [status for _, status, _ in results] == ["exported"]
+    export = db.session.get(RegisterExport, dataset.dataset)
+    assert file_sha256(file_path) == export.sha256
+
+
+def test_export_registers_hashes_the_bytes_written(dataset, tmp_path):
+    dataset.records[0].data = {"name": "Ysgol Gymraeg – Caerdydd"}
+    db.session.commit()
+
+    export_registers(tmp_path, workers=1)
+
+    file_path = tmp_path / "design-code-status.csv"
+    assert "Ysgol Gymraeg – Caerdydd" in file_path.read_text(encoding="utf-8")
+    export = db.session.get(RegisterExport, dataset.dataset)
+    assert file_sha256(file_path) == export.sha256
+    results = export_registers(tmp_path, workers=1)
+    assert [status for _, status, _ in results] == ["unchanged"]
+
+
+def test_export_registers_exports_again_into_an_empty_directory(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+    sha256 = file_sha256(tmp_path / "design-code-status.csv")
+
+    fresh = tmp_path / "fresh"
+    fresh.mkdir()
+    results = export_registers(fresh, workers=1)
+    assert [status for _, status, _ in results] == ["exported"]
+    assert file_sha256(fresh / "design-code-status.csv") == sha256
+
+
+class FakeRepo:
+    """
+    Just enough of a PyGithub Repository's Git data API to push registers.
+    """
+
+    default_branch = "main"
+
+    def __init__(self, files=None):
+        self.blobs = {
+            path: git_blob_sha(content) for path, content in (files or {}).items()
+        }
+        self.commits = []
+        self.head = "commit-0"
+        self.calls = []
+
+    def get_git_ref(self, ref):
+        self.calls.append(("get_git_ref", ref))
+        repo = self
+
+        class Ref:
+            object = SimpleNamespace(sha=self.head)
+
+            def edit(self, sha):
+                repo.head = sha
+
+        return Ref()
+
+    def get_git_commit(self, sha):
+        self.calls.append(("get_git_commit", sha))
+        return SimpleNamespace(sha=sha, tree=SimpleNamespace(sha=f"tree-{sha}"))
+
+    def get_git_tree(self, sha, recursive=False):
+        self.calls.append(("get_git_tree", sha))
+        return SimpleNamespace(
+            tree=[
+                SimpleNamespace(path=path, sha=blob, type="blob")
+                for path, blob in self.blobs.items()
+            ]
+        )
+
+    def create_git_tree(self, elements, base_tree):
+        self.calls.append(("create_git_tree", base_tree.sha))
+        for element in elements:
+            data = element._identity
+            self.blobs[data["path"]] = git_blob_sha(data["content"].encode("utf-8"))
+        return SimpleNamespace(elements=elements)
+
+    def create_git_commit(self, message, tree, parents):
+        commit = SimpleNamespace(
+            sha=f"commit-{len(self.commits) + 1}",
+            message=message,
+            paths=[element._identity["path"] for element in tree.elements],
+            parents=[parent.sha for parent in parents],
+        )
+        self.commits.append(commit)
+        return commit
+
+
+def test_push_changed_registers_pushes_in_one_commit(dataset, seed_dataset, tmp_path):
+    seed_dataset("other-status", records=1)
+    export_registers(tmp_path, workers=1)
+    repo = FakeRepo()
+
+    pushed, commit = push_changed_registers(repo, "data", tmp_path)
+
+    assert pushed == ["data/design-code-status.csv", "data/other-status.csv"]
+    assert repo.commits == [commit]
+    assert commit.paths == pushed
+    assert commit.parents == ["commit-0"]
+    assert repo.head == commit.sha
+    assert repo.blobs["data/design-code-status.csv"] == git_blob_sha(
+        (tmp_path / "design-code-status.csv").read_bytes()
+    )
+
+
+def test_push_changed_registers_skips_pushed_registers(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+    repo = FakeRepo()
+    push_changed_registers(repo, "data", tmp_path)
+    repo.calls = []
+
+    assert push_changed_registers(repo, "data", tmp_path) == ([], None)
+    assert repo.calls == []
+
+    dataset.records[0].data = {"name": "Renamed"}
+    db.session.commit()
+    export_registers(tmp_path, workers=1)
+
+    pushed, commit = push_changed_registers(repo, "data", tmp_path)
+    assert pushed == ["data/design-code-status.csv"]
+    assert commit.parents == ["commit-1"]
+
+
+def test_push_changed_registers_does_not_commit_matching_files(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+    content = (tmp_path / "design-code-status.csv").read_bytes()
+    repo = FakeRepo({"data/design-code-status.csv": content})
+
+    assert push_changed_registers(repo, "data", tmp_path) == ([], None)
+    assert repo.commits == []
+    export = db.session.get(RegisterExport, "design-code-status")
+    assert export.pushed_sha256 == file_sha256(tmp_path / "design-code-status.csv")
+
+
+def test_push_changed_registers_skips_registers_exported_again(dataset, tmp_path):
+    export_registers(tmp_path, workers=1)
+    repo = FakeRepo()
+    push_changed_registers(repo, "data", tmp_path)
+    repo.calls = []
+
+    # a one-off dyno starts without the files from the last run
+    fresh = tmp_path / "fresh"
+    fresh.mkdir()
+    export_registers(fresh, workers=1)
+
+    assert push_changed_registers(repo, "data", fresh) == ([], None)
+    assert repo.calls == []
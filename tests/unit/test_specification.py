@@ -0,0 +1,78 @@
+import os
+
+import pytest
+import requests
+
+from application.specification import get_specification
+
+MARKDOWN = """---
+consideration: design-codes
+fields:
+- field: entity
+---
+Design code status
+"""
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers or {})
+        resp = requests.Response()
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            resp.status_code = 304
+        else:
+            resp.status_code = 200
+            resp._content = MARKDOWN.encode()
+            resp.headers["ETag"] = '"v1"'
+        return resp
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {
+        "SPECIFICATION_PATH": None,
+        "SPECIFICATION_CACHE_DIR": str(tmp_path / "cache"),
+        "SPECIFICATION_CACHE_MAX_AGE": 600,
+    }
+
+
+def test_reads_local_checkout_without_network(tmp_path, config):
+    dataset_dir = tmp_path / "specification" / "content" / "dataset"
+    dataset_dir.mkdir(parents=True)
+    (dataset_dir / "design-code-status.md").write_text(MARKDOWN)
+    config["SPECIFICATION_PATH"] = str(tmp_path / "specification")
+
+    _, front = get_specification(None, "design-code-status", config)
+    _, missing = get_specification(None, "flood-risk-level", config)
+
+    assert front["consideration"] == "design-codes"
+    assert missing is None
+
+
+def test_fresh_cache_is_used_without_a_request(config):
+    client = FakeClient()
+
+    _, first = get_specification(client, "design-code-status", config)
+    _, second = get_specification(client, "design-code-status", config)
+
+    assert first == second
+    assert first["fields"] == [{"field": "entity"}]
+    assert len(client.requests) == 1
+
+
+def test_stale_cache_is_revalidated_with_etag(config):
+    client = FakeClient()
+    get_specification(client, "design-code-status", config)
+    cache_path = os.path.join(
+        config["SPECIFICATION_CACHE_DIR"], "design-code-status.json"
+    )
+    os.utime(cache_path, (0, 0))
+
+    _, front = get_specification(client, "design-code-status", config)
+
+    assert client.requests[-1] == {"If-None-Match": '"v1"'}
+    assert front["consideration"] == "design-codes"
+    assert os.path.getmtime(cache_path) > 0